@@ -1,3 +1,5 @@
+using System.Security.Cryptography;
+using System.Text;
 using Microsoft.AspNetCore.Mvc;
 using CSUBotAPI.DTOs;
 using CSUBotAPI.Services;
@@ -31,7 +33,17 @@ public class WordsController : ControllerBase
     public async Task<IActionResult> GetWords([FromQuery] long userId)
     {
         var (words, totalAccessCount) = await _wordService.GetWordsAsync(userId);
-        
+
+        // Слабый ETag по составу слов (без счётчиков обращений):
+        // если список не изменился, бот получает 304 без тела
+        var etag = WordsETag(words);
+        // ETag нужен и в ответе 304 (RFC 9110, 15.4.5)
+        Response.Headers.ETag = etag;
+        if (Request.Headers.IfNoneMatch.Contains(etag))
+        {
+            return StatusCode(StatusCodes.Status304NotModified);
+        }
+
         return Ok(new
         {
             userId,
@@ -39,4 +51,17 @@ public class WordsController : ControllerBase
             words              // ← каждый объект содержит свой AccessCount
         });
     }
+
+    private static string WordsETag(List<WordResponse> words)
+    {
+        var builder = new StringBuilder();
+        foreach (var w in words)
+        {
+            builder.Append(w.Word).Append('\u001f')
+                .Append(w.Translation).Append('\u001f')
+                .Append(w.Definition).Append('\u001e');
+        }
+        var hash = SHA256.HashData(Encoding.UTF8.GetBytes(builder.ToString()));
+        return $"W/\"{Convert.ToHexString(hash, 0, 16)}\"";
+    }
 }
\ No newline at end of file
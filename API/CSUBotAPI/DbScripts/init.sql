@@ -12,4 +12,6 @@ CREATE TABLE IF NOT EXISTS words (
     definition TEXT,
     created_at TIMESTAMPTZ DEFAULT NOW(),
     UNIQUE(user_id, word)
-);
\ No newline at end of file
+);
+
+CREATE INDEX IF NOT EXISTS idx_words_user_created ON words (user_id, created_at);
\ No newline at end of file
@@ -6,92 +6,834 @@
 # 3. Автоматические напоминания о повторении слов
 import os
 import re
+import sys
+import string
+import asyncio
+import time
+import sqlite3
+import queue
+import atexit
+import mmap
+import struct
+import hashlib
 import logging
-import requests
+import logging.handlers
 import random
 import datetime
-from typing import Dict, List, Optional, Any
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor
+from dataclasses import dataclass, field
+from typing import Awaitable, Callable, Dict, List, Optional, Any
 from dotenv import load_dotenv
-from googletrans import Translator as GoogleTranslator
-import deepl
-from bs4 import BeautifulSoup
-from telegram import InlineKeyboardMarkup, InlineKeyboardButton, Update
+import httpx
+import orjson
+from cachetools import TTLCache
+try:
+    from selectolax.parser import HTMLParser
+except ImportError:  # без selectolax разбираем страницы через lxml
+    HTMLParser = None
+    try:
+        import lxml.html
+    except ImportError as e:
+        raise ImportError('Для разбора страниц Cambridge нужен selectolax или lxml '
+                          '(pip install -r requirements.txt)') from e
+from telegram import InlineKeyboardMarkup, InlineKeyboardButton, InputFile, Update
+from telegram.constants import ParseMode
+from telegram.error import Forbidden
+from telegram.helpers import escape_markdown
 from telegram.ext import (
     Application, CommandHandler, MessageHandler,
-    CallbackQueryHandler, filters, ContextTypes, JobQueue
+    CallbackQueryHandler, TypeHandler, filters, ContextTypes, JobQueue,
+    AIORateLimiter
 )
 
 # === ИНИЦИАЛИЗАЦИЯ ===
 load_dotenv('.env')
 
-google_translator = GoogleTranslator()
-DEEPL_API_KEY = os.getenv('DEEPL_API_KEY')
-deepl_translator = deepl.Translator(DEEPL_API_KEY) if DEEPL_API_KEY else None
-
-logging.basicConfig(
-    format='%(asctime)s - %(name)s - %(levelname)s - %(message)s',
-    level=logging.INFO
-)
+# Запись логов выполняется в фоновом потоке QueueListener, чтобы вывод
+# в stdout/файл не блокировал event loop
+log_queue = queue.SimpleQueue()
+log_handler = logging.StreamHandler()
+log_handler.setFormatter(logging.Formatter('%(asctime)s - %(name)s - %(levelname)s - %(message)s'))
+log_listener = logging.handlers.QueueListener(log_queue, log_handler, respect_handler_level=True)
+# QueueHandler подставляет в запись только текст сообщения: время, имя
+# и уровень добавляет обработчик в потоке QueueListener
+queue_handler = logging.handlers.QueueHandler(log_queue)
+queue_handler.setFormatter(logging.Formatter('%(message)s'))
+logging.basicConfig(level=logging.INFO, handlers=[queue_handler])
+log_listener.start()
+atexit.register(log_listener.stop)
+# httpx пишет в INFO каждый запрос с полным URL — оставляем только предупреждения
+logging.getLogger('httpx').setLevel(logging.WARNING)
 logger = logging.getLogger(__name__)
 
-TOKEN = os.getenv('TOKEN')
-BOT_API_KEY = os.getenv('BOT_API_KEY')
-if not TOKEN:
-    raise RuntimeError('TOKEN не задан в .env')
-if not BOT_API_KEY:
-    logger.warning('BOT_API_KEY не задан в .env. Отправка данных на сервер будет ограничена.')
 
-# Запрос test_mode при запуске
-test_input = input("Enable test_mode? (Y/N): ").strip().upper()
-TEST_MODE = test_input == "Y"
-ADMIN_CHAT_ID = os.getenv('ADMIN_CHAT_ID')
+def getenv(name: str, default: Optional[str] = None) -> Optional[str]:
+    """
+    Читает переменную окружения; пустое значение считается незаданным
+    (docker-compose передает неустановленные ${VAR} как пустую строку).
+    
+    Args:
+        name: Имя переменной
+        default: Значение, если переменная не задана или пуста
+    
+    Returns:
+        Значение переменной или default
+    """
+    return os.getenv(name) or default
+
+
+@dataclass(frozen=True, slots=True)
+class Config:
+    """Настройки бота, прочитанные из окружения один раз при запуске."""
+    token: str
+    bot_api_key: Optional[str]
+    base_api_url: str
+    admin_chat_id: Optional[str]
+    google_api_key: Optional[str]
+    deepl_api_key: Optional[str]
+    # Локальная база SQLite для состояния бота (кэш переводов, напоминания)
+    state_db_path: str
+    # Webhook-режим: если задан webhook_host, Telegram сам присылает
+    # обновления, иначе бот работает через getUpdates (polling)
+    webhook_host: Optional[str]
+    webhook_port: int
+    webhook_secret: Optional[str]
+    # Файл с offset последнего обработанного обновления (режим polling)
+    update_offset_path: str
+
+    @classmethod
+    def from_env(cls) -> 'Config':
+        """Читает настройки из переменных окружения (.env уже загружен)."""
+        token = getenv('TOKEN')
+        if not token:
+            raise RuntimeError('TOKEN не задан в .env')
+        return cls(
+            token=token,
+            bot_api_key=getenv('BOT_API_KEY'),
+            base_api_url=getenv('BASE_API_URL', 'http://localhost:5000/api/v1'),
+            admin_chat_id=getenv('ADMIN_CHAT_ID'),
+            google_api_key=getenv('GOOGLE_API_KEY'),
+            deepl_api_key=getenv('DEEPL_API_KEY'),
+            state_db_path=getenv('STATE_DB_PATH', 'bot_state.sqlite3'),
+            webhook_host=getenv('WEBHOOK_HOST'),
+            webhook_port=int(getenv('PORT', '8443')),
+            webhook_secret=getenv('WEBHOOK_SECRET'),
+            update_offset_path=getenv('UPDATE_OFFSET_PATH', 'update_offset.bin')
+        )
+
+CONFIG = Config.from_env()
+if not CONFIG.bot_api_key:
+    logger.warning('BOT_API_KEY не задан в .env. Отправка данных на сервер будет ограничена.')
+if not CONFIG.google_api_key and not CONFIG.deepl_api_key:
+    logger.warning('Не заданы GOOGLE_API_KEY и DEEPL_API_KEY. Перевод слов будет недоступен.')
+
+# Тестовый режим задается переменной TEST_MODE; спрашиваем только
+# при интерактивном запуске из терминала
+if sys.stdin.isatty() and 'TEST_MODE' not in os.environ:
+    TEST_MODE = input("Enable test_mode? (Y/N): ").strip().upper() == "Y"
+else:
+    TEST_MODE = os.getenv('TEST_MODE', '').strip().upper() in ('1', 'Y', 'YES', 'TRUE')
+WELCOME_IMAGE = 'welcome.jpg'
 END_TEST_IMAGE = 'end_test.jpg'
-BASE_API_URL = os.getenv('BASE_API_URL', 'http://localhost:5000/api/v1')
+
+# Официальный REST API Google Cloud Translation (v2)
+GOOGLE_TRANSLATE_URL = 'https://translation.googleapis.com/language/translate/v2'
+# Максимум текстов в одном запросе к Google Cloud Translation v2
+GOOGLE_BATCH_SIZE = 128
+# Ключи бесплатного тарифа DeepL оканчиваются на ':fx' и обслуживаются отдельным хостом
+DEEPL_API_URL = (
+    'https://api-free.deepl.com/v2/translate'
+    if CONFIG.deepl_api_key and CONFIG.deepl_api_key.endswith(':fx')
+    else 'https://api.deepl.com/v2/translate'
+)
+
+# Общий асинхронный HTTP-клиент: создаётся в post_init и переиспользует
+# соединения для Cambridge, Google и DeepL
+http_client: Optional[httpx.AsyncClient] = None
+# Отдельный клиент для API сервера слов: base_url и ключ API заданы один раз
+api_client: Optional[httpx.AsyncClient] = None
+
+# Пакетный отправитель запросов в DeepL (создаётся в post_init)
+deepl_batcher: Optional['DeepLBatcher'] = None
+
+# Регулярные выражения компилируются один раз при загрузке модуля
+NON_WORD_CHARS_RE = re.compile(r'[^a-z\-]')
+# Английское слово или фраза, которые имеет смысл искать в Cambridge
+CAMBRIDGE_WORD_RE = re.compile(r"[a-z][a-z\-' ]{0,63}")
+# Знаки препинания по краям перевода («Hello!», "o'clock."), которые
+# отбрасываются перед проверкой CAMBRIDGE_WORD_RE
+CAMBRIDGE_STRIP_CHARS = string.punctuation + string.whitespace + '«»“”‘’„…—–'
+WHITESPACE_RE = re.compile(r'\s+')
+# Разделители слов во вводе пользователя: запятые, точки с запятой и переводы строк
+WORD_SPLIT_RE = re.compile(r'[,;\n]+')
+
+# Заголовки запросов к Cambridge Dictionary
+# (Accept-Encoding: br, gzip задан у общего клиента)
+CAMBRIDGE_HEADERS = {
+    'User-Agent': 'Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36',
+    'Accept': 'text/html'
+}
+
+# Выбор режима работы после /start
+MODE_KEYBOARD = InlineKeyboardMarkup([
+    [InlineKeyboardButton("Добавить слово", callback_data="mode::add")],
+    [InlineKeyboardButton("Проверить знания", callback_data="mode::quiz")]
+])
+
+# Выбор языка добавляемого слова
+LANG_KEYBOARD = InlineKeyboardMarkup([
+    [InlineKeyboardButton("Русское слово", callback_data="lang::ru")],
+    [InlineKeyboardButton("Английское слово", callback_data="lang::en")]
+])
+
+# Кнопка в ежедневном напоминании
+REMINDER_KEYBOARD = InlineKeyboardMarkup([
+    [InlineKeyboardButton("✅ Проверить знания", callback_data="mode::quiz")]
+])
+
+# Меню после добавления всех слов
+POST_ACTIONS_KEYBOARD = InlineKeyboardMarkup([
+    [InlineKeyboardButton("Добавить слово", callback_data="post_add")],
+    [InlineKeyboardButton("Проверить знания", callback_data="post_quiz")],
+    [InlineKeyboardButton("Завершить программу", callback_data="post_finish")]
+])
+
+# Запись в SQLite (commit с fsync) выполняется в отдельном потоке, чтобы не
+# блокировать event loop; один поток сериализует все записи
+STATE_DB_EXECUTOR = ThreadPoolExecutor(max_workers=1, thread_name_prefix='state-db')
+# Соединения для записи: открываются и используются только в потоке
+# STATE_DB_EXECUTOR. Чтения в event loop идут через отдельные соединения —
+# вызовы одного соединения SQLite сериализует, и SELECT ждал бы commit
+state_db_writers: Dict[str, sqlite3.Connection] = {}
+
+def state_db_writer(path: str) -> sqlite3.Connection:
+    """Возвращает соединение для записи в базу состояния (только из STATE_DB_EXECUTOR)."""
+    db = state_db_writers.get(path)
+    if db is None:
+        db = state_db_writers[path] = sqlite3.connect(path)
+        db.execute('PRAGMA journal_mode=WAL')
+    return db
+
+# Бот обрабатывает только сообщения и нажатия кнопок — остальные типы
+# обновлений Telegram не присылает
+ALLOWED_UPDATES = [Update.MESSAGE, Update.CALLBACK_QUERY]
+
+# === КЭШ ПЕРЕВОДОВ ===
+
+class TranslationCache:
+    """
+    Двухуровневый кэш переводов: TTLCache в памяти поверх таблицы SQLite.
+    Повторный запрос того же слова не обращается к внешним сервисам,
+    а записи в SQLite переживают перезапуск бота. Здесь же хранятся
+    определения Cambridge (провайдер 'Cambridge').
+    """
+
+    def __init__(self, path: str, maxsize: int = 10_000,
+                 memory_ttl: int = 72 * 3600, db_ttl: int = 30 * 24 * 3600):
+        self._memory = TTLCache(maxsize=maxsize, ttl=memory_ttl)
+        self._db_ttl = db_ttl
+        self._path = path
+        # Соединение для чтения в event loop; в режиме WAL чтения не ждут
+        # commit соединения-писателя из STATE_DB_EXECUTOR
+        self._db = sqlite3.connect(path)
+        self._db.execute('PRAGMA journal_mode=WAL')
+        self._db.execute(
+            'CREATE TABLE IF NOT EXISTS tcache ('
+            'k TEXT PRIMARY KEY, resp TEXT NOT NULL, ts REAL NOT NULL)'
+        )
+        self._db.commit()
+
+    @staticmethod
+    def make_key(provider: str, src: str, dest: str, text: str) -> str:
+        """Ключ кэша: sha1 от провайдера, языковой пары и текста."""
+        return hashlib.sha1(f"{provider}|{src}|{dest}|{text}".encode()).hexdigest()
+
+    def get(self, key: str) -> Optional[Any]:
+        """Возвращает сохранённый перевод или None, если его нет или он устарел."""
+        value = self._memory.get(key)
+        if value is not None:
+            return value
+        row = self._db.execute('SELECT resp, ts FROM tcache WHERE k = ?', (key,)).fetchone()
+        if row is None or time.time() - row[1] > self._db_ttl:
+            return None
+        value = orjson.loads(row[0])
+        self._memory[key] = value
+        return value
+
+    def set(self, key: str, value: Any):
+        """Сохраняет перевод в памяти и ставит запись в SQLite в фоновый поток."""
+        self._memory[key] = value
+        STATE_DB_EXECUTOR.submit(self._persist, key, orjson.dumps(value), time.time())
+
+    def _persist(self, key: str, resp: bytes, ts: float):
+        db = state_db_writer(self._path)
+        db.execute('INSERT OR REPLACE INTO tcache VALUES (?, ?, ?)', (key, resp, ts))
+        db.commit()
+
+
+translation_cache = TranslationCache(CONFIG.state_db_path)
+
+# Переводы, которые выполняются прямо сейчас: ключ кэша -> Future с результатом
+translation_inflight: Dict[str, asyncio.Future] = {}
+
+
+async def single_flight(inflight: Dict[Any, asyncio.Future], key: Any,
+                        factory: Callable[[], Awaitable[Any]]) -> Any:
+    """
+    Объединяет одновременные вызовы с одинаковым ключом: первый вызов
+    выполняет factory(), остальные ждут его результата.
+    
+    Args:
+        inflight: Словарь выполняющихся вызовов
+        key: Ключ, по которому вызовы считаются одинаковыми
+        factory: Функция, создающая корутину с реальной работой
+    
+    Returns:
+        Результат factory()
+    """
+    future = inflight.get(key)
+    if future is not None:
+        return await asyncio.shield(future)
+
+    future = asyncio.get_running_loop().create_future()
+    inflight[key] = future
+    try:
+        result = await factory()
+    except asyncio.CancelledError:
+        future.cancel()
+        raise
+    except Exception as e:
+        future.set_exception(e)
+        future.exception()  # помечаем исключение полученным, если ждущих нет
+        raise
+    finally:
+        inflight.pop(key, None)
+    future.set_result(result)
+    return result
+
+
+# === НАПОМИНАНИЯ ===
+
+REMINDER_HOUR_UTC = 20
+REMINDER_JOB_PREFIX = 'reminder:'
+REMINDER_SCAN_INTERVAL = 3600
+
+
+class ReminderStore:
+    """
+    Сроки напоминаний о повторении слов, хранящиеся в SQLite.
+    В JobQueue попадают только напоминания ближайшего часа, поэтому
+    число задач в памяти не зависит от числа пользователей.
+    """
+
+    def __init__(self, path: str):
+        self._path = path
+        # Соединение для чтения в event loop; запись — через state_db_writer
+        self._db = sqlite3.connect(path)
+        self._db.execute('PRAGMA journal_mode=WAL')
+        self._db.execute(
+            'CREATE TABLE IF NOT EXISTS reminders ('
+            'chat_id INTEGER PRIMARY KEY, due_ts REAL NOT NULL)'
+        )
+        self._db.execute('CREATE INDEX IF NOT EXISTS reminders_due_ts ON reminders(due_ts)')
+        self._db.commit()
+
+    def schedule(self, chat_id: int, due_ts: float):
+        """Устанавливает время следующего напоминания пользователю (запись в фоне)."""
+        STATE_DB_EXECUTOR.submit(self._persist, chat_id, due_ts)
+
+    def _persist(self, chat_id: int, due_ts: float):
+        db = state_db_writer(self._path)
+        db.execute('INSERT OR REPLACE INTO reminders VALUES (?, ?)', (chat_id, due_ts))
+        db.commit()
+
+    def ensure(self, chat_id: int, due_ts: float):
+        """Добавляет напоминание, если у пользователя его еще нет (запись в фоне)."""
+        STATE_DB_EXECUTOR.submit(self._insert_missing, chat_id, due_ts)
+
+    def _insert_missing(self, chat_id: int, due_ts: float):
+        db = state_db_writer(self._path)
+        db.execute('INSERT OR IGNORE INTO reminders VALUES (?, ?)', (chat_id, due_ts))
+        db.commit()
+
+    def remove(self, chat_id: int):
+        """Удаляет напоминания пользователя (запись в фоне)."""
+        STATE_DB_EXECUTOR.submit(self._delete, chat_id)
+
+    def _delete(self, chat_id: int):
+        db = state_db_writer(self._path)
+        db.execute('DELETE FROM reminders WHERE chat_id = ?', (chat_id,))
+        db.commit()
+
+    def due_before(self, ts: float) -> List[tuple]:
+        """Возвращает пары (chat_id, due_ts) напоминаний, срок которых наступает до ts."""
+        return self._db.execute(
+            'SELECT chat_id, due_ts FROM reminders WHERE due_ts < ?', (ts,)
+        ).fetchall()
+
+
+def next_reminder_ts() -> float:
+    """Возвращает ближайший момент ежедневного напоминания (20:00 UTC)."""
+    now = datetime.datetime.now(datetime.timezone.utc)
+    due = now.replace(hour=REMINDER_HOUR_UTC, minute=0, second=0, microsecond=0)
+    if due <= now:
+        due += datetime.timedelta(days=1)
+    return due.timestamp()
+
+
+reminder_store = ReminderStore(CONFIG.state_db_path)
+
+
+# === OFFSET ОБНОВЛЕНИЙ ===
+
+class UpdateOffsetStore:
+    """
+    Offset следующего необработанного обновления в 8-байтовом файле,
+    отображённом в память. После перезапуска уже обработанные обновления
+    подтверждаются в Telegram и не обрабатываются повторно.
+    """
+
+    def __init__(self, path: str):
+        self._file = open(path, 'a+b')
+        if os.path.getsize(path) < 8:
+            self._file.truncate(8)
+        self._mm = mmap.mmap(self._file.fileno(), 8)
+
+    def get(self) -> int:
+        """Возвращает сохранённый offset (0, если его ещё нет)."""
+        return struct.unpack_from('<q', self._mm)[0]
+
+    def set(self, offset: int):
+        """Сохраняет offset: запись 8 байт в отображённую память."""
+        struct.pack_into('<q', self._mm, 0, offset)
+
+    def close(self):
+        """Сбрасывает offset на диск и закрывает файл."""
+        self._mm.flush()
+        self._mm.close()
+        self._file.close()
+
+
+async def remember_update_offset(update: Update, context: ContextTypes.DEFAULT_TYPE):
+    """Запоминает offset после того, как обновление обработано."""
+    update_offset_store.set(update.update_id + 1)
+
+
+update_offset_store: Optional[UpdateOffsetStore] = None
+
+# === ОГРАНИЧЕНИЕ ЗАПРОСОВ К ВНЕШНИМ СЕРВИСАМ ===
+
+# Одновременных запросов к каждому сервису на весь бот
+PROVIDER_CONCURRENCY = {'Google': 5, 'DeepL': 5, 'Cambridge': 5, 'CambridgePrefetch': 2}
+# Ответы «слишком много запросов»: повторяются с экспоненциальной задержкой
+PROVIDER_RETRY_STATUSES = {429, 503}
+PROVIDER_RETRY_ATTEMPTS = 4
+PROVIDER_RETRY_BACKOFF = 0.1
+PROVIDER_RETRY_MAX_DELAY = 4.0
+
+# Семафоры создаются при первом запросе, уже внутри работающего event loop
+provider_semaphores: Dict[str, asyncio.Semaphore] = {}
+
+def provider_semaphore(provider: str) -> asyncio.Semaphore:
+    """Возвращает семафор, ограничивающий параллельные запросы к сервису."""
+    semaphore = provider_semaphores.get(provider)
+    if semaphore is None:
+        semaphore = provider_semaphores[provider] = asyncio.Semaphore(PROVIDER_CONCURRENCY[provider])
+    return semaphore
+
+async def provider_request(provider: str,
+                           send: Callable[[], Awaitable[httpx.Response]]) -> httpx.Response:
+    """
+    Выполняет запрос к внешнему сервису с ограничением параллельности и
+    повтором при 429/503: задержка растет экспоненциально (0.1 с, 0.2 с, ...
+    до 4 с) со случайным разбросом, а заголовок Retry-After имеет приоритет.
+    
+    Args:
+        provider: Название сервиса ('Google', 'DeepL', 'Cambridge')
+        send: Функция, выполняющая запрос
+    
+    Returns:
+        Ответ сервиса (последней попытки)
+    """
+    for attempt in range(PROVIDER_RETRY_ATTEMPTS):
+        async with provider_semaphore(provider):
+            response = await send()
+        if response.status_code not in PROVIDER_RETRY_STATUSES or attempt == PROVIDER_RETRY_ATTEMPTS - 1:
+            return response
+        retry_after = response.headers.get('Retry-After', '')
+        if retry_after.isdigit():
+            delay = min(float(retry_after), PROVIDER_RETRY_MAX_DELAY)
+        else:
+            delay = min(PROVIDER_RETRY_BACKOFF * 2 ** attempt, PROVIDER_RETRY_MAX_DELAY)
+            delay *= random.uniform(0.5, 1.5)
+        logger.warning("%s ответил %d, повтор через %.2f с", provider, response.status_code, delay)
+        await asyncio.sleep(delay)
+
+# === ПАКЕТНЫЙ ПЕРЕВОД DEEPL ===
+
+class DeepLBatcher:
+    """
+    Собирает запросы на перевод в течение короткого окна и отправляет их
+    в DeepL одним вызовом /v2/translate, который принимает список текстов.
+    Несколько одновременных переводов стоят одного сетевого запроса.
+    """
+
+    def __init__(self, window: float = 0.05, max_batch: int = 50):
+        self._queue: asyncio.Queue = asyncio.Queue()
+        self._window = window
+        self._max_batch = max_batch
+        self._task: Optional[asyncio.Task] = None
+        # Отправляемые пакеты: ссылки держим, чтобы задачи не собрал GC
+        self._sends: set = set()
+
+    def start(self):
+        """Запускает фоновую задачу сбора пакетов."""
+        self._task = asyncio.create_task(self._run())
+
+    async def stop(self):
+        """Останавливает фоновую задачу и отправку пакетов."""
+        tasks = list(self._sends)
+        if self._task is not None:
+            tasks.append(self._task)
+        for task in tasks:
+            task.cancel()
+        await asyncio.gather(*tasks, return_exceptions=True)
+
+    async def translate(self, text: str, source_lang: str, target_lang: str) -> str:
+        """Ставит текст в очередь и ждёт его перевода."""
+        future = asyncio.get_running_loop().create_future()
+        await self._queue.put((text, source_lang, target_lang, future))
+        return await future
+
+    async def _run(self):
+        loop = asyncio.get_running_loop()
+        while True:
+            items = [await self._queue.get()]
+            deadline = loop.time() + self._window
+            while len(items) < self._max_batch:
+                timeout = deadline - loop.time()
+                if timeout <= 0:
+                    break
+                try:
+                    items.append(await asyncio.wait_for(self._queue.get(), timeout))
+                except asyncio.TimeoutError:
+                    break
+
+            # Один запрос DeepL — одна языковая пара. Пакеты отправляются
+            # в отдельных задачах: повтор одного пакета после 429 не задерживает сбор
+            # следующих
+            groups: Dict[tuple, list] = {}
+            for item in items:
+                groups.setdefault((item[1], item[2]), []).append(item)
+            for (source_lang, target_lang), group in groups.items():
+                task = asyncio.create_task(self._send(source_lang, target_lang, group))
+                self._sends.add(task)
+                task.add_done_callback(self._sends.discard)
+
+    async def _send(self, source_lang: str, target_lang: str, group: list):
+        # Повтор при 429/503 выполняет provider_request — для каждого пакета отдельно
+        try:
+            body = orjson.dumps({
+                'text': [text for text, *_ in group],
+                'source_lang': source_lang,
+                'target_lang': target_lang
+            })
+            response = await provider_request('DeepL', lambda: http_client.post(
+                DEEPL_API_URL,
+                headers={
+                    'Authorization': f'DeepL-Auth-Key {CONFIG.deepl_api_key}',
+                    'Content-Type': 'application/json'
+                },
+                content=body
+            ))
+            response.raise_for_status()
+            results = orjson.loads(response.content)['translations']
+        except asyncio.CancelledError:
+            for *_, future in group:
+                future.cancel()
+            raise
+        except Exception as e:
+            for *_, future in group:
+                if not future.done():
+                    future.set_exception(e)
+            return
+
+        for (*_, future), result in zip(group, results):
+            if not future.done():
+                future.set_result(result['text'].strip())
+        # Если DeepL вернул меньше переводов, чем получил текстов, оставшиеся
+        # вызовы не должны ждать вечно
+        for *_, future in group[len(results):]:
+            if not future.done():
+                future.set_exception(RuntimeError('DeepL вернул меньше переводов, чем было отправлено'))
+
+# === ИЗОБРАЖЕНИЯ ===
+
+def load_image(path: str) -> Optional[bytes]:
+    """
+    Читает изображение с диска один раз при запуске.
+    
+    Args:
+        path: Путь к файлу изображения
+    
+    Returns:
+        Содержимое файла или None, если файла нет
+    """
+    try:
+        with open(path, 'rb') as f:
+            return f.read()
+    except OSError:
+        logger.warning("Изображение %s не найдено, будет отправляться только текст", path)
+        return None
+
+IMAGE_BYTES = {path: load_image(path) for path in (WELCOME_IMAGE, END_TEST_IMAGE)}
+# file_id уже загруженных в Telegram изображений: повторная отправка без загрузки
+IMAGE_FILE_IDS: Dict[str, str] = {}
+
+async def send_cached_photo(context: ContextTypes.DEFAULT_TYPE, chat_id: int, path: str,
+                            caption: str, parse_mode: Optional[str] = None) -> bool:
+    """
+    Отправляет изображение из памяти, а после первой загрузки — по file_id.
+    
+    Args:
+        context: Контекст бота
+        chat_id: ID чата пользователя
+        path: Имя файла изображения
+        caption: Подпись к изображению
+        parse_mode: Режим разметки подписи
+    
+    Returns:
+        True, если изображение отправлено
+    """
+    photo = IMAGE_FILE_IDS.get(path)
+    if photo is None:
+        data = IMAGE_BYTES.get(path)
+        if data is None:
+            return False
+        photo = InputFile(data, filename=os.path.basename(path))
+    
+    try:
+        message = await context.bot.send_photo(
+            chat_id=chat_id,
+            photo=photo,
+            caption=caption,
+            parse_mode=parse_mode
+        )
+    except Exception as e:
+        logger.error("Ошибка отправки изображения %s: %s", path, e)
+        IMAGE_FILE_IDS.pop(path, None)
+        return False
+    
+    if message.photo:
+        IMAGE_FILE_IDS[path] = message.photo[-1].file_id
+    return True
 
 # === ВСПОМОГАТЕЛЬНЫЕ ФУНКЦИИ ===
 
-def fetch_cambridge_definition(word: str) -> str:
+# Найденные определения Cambridge хранятся в кэше переводов (72 часа в памяти,
+# 30 дней в SQLite); отсутствующие — 1 час в памяти, чтобы не запрашивать 404 повторно
+cambridge_miss_cache = TTLCache(maxsize=5000, ttl=3600)
+cambridge_inflight: Dict[str, asyncio.Future] = {}
+
+def cambridge_cache_key(clean_word: str) -> str:
+    """Ключ определения Cambridge в кэше переводов (память + SQLite на 30 дней)."""
+    return TranslationCache.make_key('Cambridge', 'en', 'en', clean_word)
+
+async def fetch_cambridge_definition(word: str) -> str:
     """
     Получает определение слова с Cambridge Dictionary.
     Очищает текст от лишних пробелов и форматирования.
+    Одновременные запросы одного слова выполняются одним обращением к сайту.
     
     Args:
         word: Английское слово для поиска определения
     
+    Returns:
+        Очищенное определение или пустая строка, если определение не найдено
+    """
+    # Слова с цифрами, кириллицей и прочими символами в Cambridge не ищем:
+    # такой запрос заведомо закончится 404
+    word_lower = word.lower().replace('’', "'").strip(CAMBRIDGE_STRIP_CHARS)
+    if not CAMBRIDGE_WORD_RE.fullmatch(word_lower):
+        return ""
+    # Подготавливаем слово для URL (только буквы и дефисы)
+    clean_word = NON_WORD_CHARS_RE.sub('', word_lower.replace(' ', '-'))
+
+    cached = translation_cache.get(cambridge_cache_key(clean_word))
+    if cached is not None:
+        return cached
+    if clean_word in cambridge_miss_cache:
+        return ""
+
+    return await single_flight(
+        cambridge_inflight, clean_word,
+        lambda: scrape_cambridge_definition(word, clean_word)
+    )
+
+# Блок первого определения на странице Cambridge: div.def.ddef_d.db
+CAMBRIDGE_DEF_SELECTOR = 'div.def.ddef_d.db'
+CAMBRIDGE_DEF_XPATH = '//div[' + ' and '.join(
+    f"contains(concat(' ', normalize-space(@class), ' '), ' {cls} ')"
+    for cls in ('def', 'ddef_d', 'db')
+) + '][1]'
+
+def extract_definition_text(html: bytes) -> Optional[str]:
+    """
+    Извлекает текст первого определения из страницы Cambridge.
+    Парсеры получают байты ответа, без промежуточного декодирования в str.
+    
+    Args:
+        html: HTML-код страницы (байты ответа)
+    
+    Returns:
+        Текст определения или None, если блок определения не найден
+    """
+    if HTMLParser is not None:
+        def_tag = HTMLParser(html).css_first(CAMBRIDGE_DEF_SELECTOR)
+        return def_tag.text() if def_tag is not None else None
+    nodes = lxml.html.fromstring(html).xpath(CAMBRIDGE_DEF_XPATH)
+    return nodes[0].text_content() if nodes else None
+
+# Начало блока первого определения в разметке Cambridge и предел чтения страницы
+CAMBRIDGE_DEF_MARKER = b'class="def ddef_d db"'
+CAMBRIDGE_MAX_PAGE_BYTES = 2 * 1024 * 1024
+
+async def read_until_definition(response: httpx.Response) -> bytes:
+    """
+    Читает потоковый ответ только до конца блока первого определения;
+    остаток страницы не загружается (поток закрывается при выходе из stream).
+    
+    Args:
+        response: Потоковый ответ Cambridge Dictionary
+    
+    Returns:
+        Прочитанная часть страницы (вся страница, если блок не найден)
+    """
+    buf = bytearray()
+    marker_at = -1
+    async for chunk in response.aiter_bytes():
+        # Ищем только в новых данных, с перекрытием на длину маркера
+        start = max(0, len(buf) - len(CAMBRIDGE_DEF_MARKER))
+        buf += chunk
+        if marker_at < 0:
+            marker_at = buf.find(CAMBRIDGE_DEF_MARKER, start)
+            start = marker_at
+        # Блок определения не содержит вложенных div: первый </div> его закрывает
+        if marker_at >= 0 and buf.find(b'</div>', start) >= 0:
+            break
+        if len(buf) >= CAMBRIDGE_MAX_PAGE_BYTES:
+            break
+    return bytes(buf)
+
+async def scrape_cambridge_definition(word: str, clean_word: str) -> str:
+    """
+    Загружает страницу слова с Cambridge Dictionary и извлекает определение.
+    
+    Args:
+        word: Исходное слово (для логов)
+        clean_word: Слово, подготовленное для URL
+    
     Returns:
         Очищенное определение или пустая строка, если определение не найдено
     """
     try:
-        # Подготавливаем слово для URL (только буквы и дефисы)
-        clean_word = re.sub(r'[^a-z\-]', '', word.strip().lower().replace(' ', '-'))
-        if not clean_word:
-            return ""
-            
         url = f"https://dictionary.cambridge.org/dictionary/english/{clean_word}"
-        headers = {
-            'User-Agent': 'Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36'
-        }
-        response = requests.get(url, headers=headers, timeout=10)
-        
-        # Обрабатываем случай, когда слово не найдено
-        if response.status_code == 404:
-            logger.info(f"Слово '{word}' не найдено в Cambridge Dictionary")
-            return ""
-        response.raise_for_status()
-
-        soup = BeautifulSoup(response.text, 'html.parser')
-        def_tag = soup.find('div', class_='def ddef_d db')
-        if not def_tag:
-            logger.info(f"Не найден тег определения для слова '{word}'")
+        async with provider_semaphore('Cambridge'), \
+                http_client.stream('GET', url, headers=CAMBRIDGE_HEADERS,
+                                   follow_redirects=True) as response:
+            # Обрабатываем случай, когда слово не найдено
+            if response.status_code == 404:
+                logger.info("Слово '%s' не найдено в Cambridge Dictionary", word)
+                cambridge_miss_cache[clean_word] = True
+                return ""
+            response.raise_for_status()
+            html = await read_until_definition(response)
+
+        raw = extract_definition_text(html)
+        if raw is None:
+            logger.info("Не найден тег определения для слова '%s'", word)
+            cambridge_miss_cache[clean_word] = True
             return ""
 
-        raw = def_tag.get_text()
-        clean = re.sub(r'\s+', ' ', raw).strip().rstrip(':.')
+        clean = WHITESPACE_RE.sub(' ', raw).strip().rstrip(':.')
+        if clean:
+            translation_cache.set(cambridge_cache_key(clean_word), clean)
+        else:
+            cambridge_miss_cache[clean_word] = True
         return clean
     except Exception as e:
         logger.warning("Ошибка при получении определения для '%s' из Cambridge Dictionary: %s", word, e)
         return ""
 
+async def google_translate(text: str, src: str, dest: str) -> str:
+    """Переводит текст через REST API Google Cloud Translation."""
+    return (await google_translate_batch([text], src, dest))[0]
+
+
+async def google_translate_batch(texts: List[str], src: str, dest: str) -> List[str]:
+    """
+    Переводит список текстов одним запросом к Google Cloud Translation
+    (параметр q принимает до 128 текстов).
+    
+    Args:
+        texts: Тексты для перевода
+        src: Язык исходных текстов
+        dest: Язык перевода
+    
+    Returns:
+        Переводы в порядке исходных текстов
+    """
+    body = orjson.dumps({'q': texts, 'source': src, 'target': dest, 'format': 'text'})
+    response = await provider_request('Google', lambda: http_client.post(
+        GOOGLE_TRANSLATE_URL,
+        # Ключ передается в заголовке: URL запроса попадает в логи
+        headers={'X-Goog-Api-Key': CONFIG.google_api_key, 'Content-Type': 'application/json'},
+        content=body
+    ))
+    response.raise_for_status()
+    return [
+        item['translatedText'].strip()
+        for item in orjson.loads(response.content)['data']['translations']
+    ]
+
+
+async def deepl_translate(text: str, src: str, dest: str) -> str:
+    """Переводит текст через REST API DeepL (запросы объединяются в пакеты)."""
+    target_lang = 'RU' if dest == 'ru' else 'EN-US'
+    source_lang = 'RU' if src == 'ru' else 'EN'
+    return await deepl_batcher.translate(text, source_lang, target_lang)
+
+
+async def translate_cached(provider: str, text: str, src: str, dest: str,
+                           translate: Callable[[str, str, str], Awaitable[str]]) -> str:
+    """
+    Переводит текст через указанный сервис, используя кэш переводов.
+    
+    Args:
+        provider: Название сервиса (часть ключа кэша)
+        text: Текст для перевода
+        src: Язык исходного текста
+        dest: Язык перевода
+        translate: Функция перевода, вызываемая при промахе кэша
+    
+    Returns:
+        Переведённый текст
+    """
+    key = TranslationCache.make_key(provider, src, dest, text)
+    cached = translation_cache.get(key)
+    if cached is not None:
+        return cached
+
+    async def fetch() -> str:
+        result = await translate(text, src, dest)
+        translation_cache.set(key, result)
+        return result
+
+    # Одинаковые переводы, запрошенные одновременно, выполняются один раз
+    return await single_flight(translation_inflight, key, fetch)
+
+
 async def get_translations(word: str, src: str, dest: str) -> Dict[str, str]:
     """
     Получает переводы слова через Google Translate и DeepL (если доступен).
@@ -104,30 +846,194 @@ async def get_translations(word: str, src: str, dest: str) -> Dict[str, str]:
     Returns:
         Словарь с переводами от разных сервисов
     """
+    providers = []
+    if CONFIG.google_api_key:
+        providers.append(('Google', google_translate))
+    if CONFIG.deepl_api_key:
+        providers.append(('DeepL', deepl_translate))
+
+    # Сервисы опрашиваются параллельно: задержка равна самому медленному из них
+    results = await asyncio.gather(
+        *(translate_cached(name, word, src, dest, translate) for name, translate in providers),
+        return_exceptions=True
+    )
+
     translations = {}
+    for (name, _), result in zip(providers, results):
+        if isinstance(result, Exception):
+            logger.warning("Ошибка %s для слова '%s': %s", name, word, result)
+        else:
+            translations[name] = result
 
-    # Google Translate
-    try:
-        google_res = await google_translator.translate(word, src=src, dest=dest)
-        translations['Google'] = google_res.text.strip()
-    except Exception as e:
-        logger.warning("Ошибка Google Translate для слова '%s': %s", word, e)
+    return translations
 
-    # DeepL
-    if deepl_translator:
+async def pretranslate_words(words: List[str], src: str, dest: str):
+    """
+    Заранее переводит весь список слов (а для английских слов — и их
+    определения). Для DeepL одновременные запросы
+    объединяются DeepLBatcher в пакеты до 50 текстов; в Google непереведенные
+    слова уходят одним запросом на каждые GOOGLE_BATCH_SIZE слов. Результаты
+    попадают в кэш переводов, откуда их затем берёт get_translations.
+    
+    Args:
+        words: Слова из очереди пользователя
+        src: Язык исходных слов
+        dest: Язык перевода
+    """
+    jobs = []
+    if CONFIG.deepl_api_key:
+        jobs.append(pretranslate_deepl(words, src, dest))
+    if CONFIG.google_api_key:
+        # Первое слово get_translations переводит сразу сам
+        jobs.append(pretranslate_google(words[1:], src, dest))
+    if src == 'en':
+        # Английские слова известны сразу: загружаем и их определения
+        jobs.append(pretranslate_definitions(words))
+    await asyncio.gather(*jobs)
+
+# Сколько первых слов списка получают определения заранее
+PREFETCH_DEFINITIONS_LIMIT = 10
+
+async def prefetch_cambridge_definition(word_en: str) -> str:
+    """
+    Загружает определение Cambridge в фоне: такие запросы занимают не больше
+    двух из пяти слотов Cambridge, чтобы не задерживать интерактивные запросы.
+    """
+    async with provider_semaphore('CambridgePrefetch'):
+        return await fetch_cambridge_definition(word_en)
+
+async def pretranslate_definitions(words_en: List[str]):
+    """
+    Загружает определения Cambridge для первых PREFETCH_DEFINITIONS_LIMIT
+    английских слов и переводит их на русский одним пакетом тем же сервисом,
+    что и translate_definition_to_russian.
+    
+    Args:
+        words_en: Английские слова из очереди пользователя
+    """
+    definitions = await asyncio.gather(*(
+        prefetch_cambridge_definition(w) for w in words_en[:PREFETCH_DEFINITIONS_LIMIT]
+    ))
+    definitions = list(dict.fromkeys(d for d in definitions if d))
+    if not definitions:
+        return
+    if CONFIG.google_api_key:
+        await pretranslate_google(definitions, 'en', 'ru')
+    elif CONFIG.deepl_api_key:
+        await pretranslate_deepl(definitions, 'en', 'ru')
+
+async def pretranslate_deepl(words: List[str], src: str, dest: str):
+    """Переводит список слов через DeepL в кэш переводов."""
+    results = await asyncio.gather(
+        *(translate_cached('DeepL', word, src, dest, deepl_translate) for word in words),
+        return_exceptions=True
+    )
+    failed = sum(isinstance(result, Exception) for result in results)
+    if failed:
+        logger.warning("Не удалось заранее перевести %d из %d слов через DeepL", failed, len(words))
+
+async def pretranslate_google(words: List[str], src: str, dest: str):
+    """Переводит непереведенные слова списка через Google пакетами в кэш переводов."""
+    keys = {word: TranslationCache.make_key('Google', src, dest, word) for word in words}
+    # Слова, которые уже переводятся, в пакет не берем
+    missing = [
+        word for word, key in keys.items()
+        if translation_cache.get(key) is None and key not in translation_inflight
+    ]
+    loop = asyncio.get_running_loop()
+    for i in range(0, len(missing), GOOGLE_BATCH_SIZE):
+        batch = missing[i:i + GOOGLE_BATCH_SIZE]
+        # Пока пакет выполняется, translate_cached ждет его результата
+        # вместо отдельного запроса к Google
+        futures = {}
+        for word in batch:
+            futures[word] = translation_inflight[keys[word]] = loop.create_future()
+        error: Optional[Exception] = RuntimeError('Google вернул меньше переводов, чем было отправлено')
         try:
-            target_lang = 'RU' if dest == 'ru' else 'EN-US'
-            source_lang = 'RU' if src == 'ru' else 'EN'
-            deepl_res = deepl_translator.translate_text(
-                word, source_lang=source_lang, target_lang=target_lang
-            )
-            translations['DeepL'] = deepl_res.text.strip()
+            results = await google_translate_batch(batch, src, dest)
+            for word, result in zip(batch, results):
+                translation_cache.set(keys[word], result)
+                futures[word].set_result(result)
         except Exception as e:
-            logger.warning("Ошибка DeepL для слова '%s': %s", word, e)
+            logger.warning("Не удалось заранее перевести %d слов через Google: %s", len(batch), e)
+            error = e
+        except asyncio.CancelledError:
+            error = None
+            raise
+        finally:
+            # Ждущие не должны зависнуть: неразрешенные Future получают ошибку
+            # (или отменяются вместе с задачей)
+            for word, future in futures.items():
+                translation_inflight.pop(keys[word], None)
+                if future.done():
+                    continue
+                if error is None:
+                    future.cancel()
+                else:
+                    future.set_exception(error)
+                    future.exception()  # помечаем исключение полученным, если ждущих нет
+
+async def translate_definition_to_russian(definition_en: str) -> str:
+    """
+    Переводит английское определение на русский через Google или, если
+    ключ Google не задан, через DeepL.
+    
+    Args:
+        definition_en: Определение на английском
+    
+    Returns:
+        Перевод определения или пустая строка, если переводчик недоступен
+    """
+    # Нормализуем пробелы, чтобы одинаковые определения попадали в один ключ кэша
+    definition_en = WHITESPACE_RE.sub(' ', definition_en).strip()
+    if not definition_en:
+        return ""
+    if CONFIG.google_api_key:
+        return await translate_cached('Google', definition_en, 'en', 'ru', google_translate)
+    if CONFIG.deepl_api_key:
+        return await translate_cached('DeepL', definition_en, 'en', 'ru', deepl_translate)
+    return ""
 
-    return translations
+async def prefetch_definition(word_en: str):
+    """
+    Заранее загружает определение Cambridge и его перевод в кэш, пока
+    пользователь выбирает перевод слова.
+    
+    Args:
+        word_en: Английское слово
+    """
+    try:
+        definition_en = await fetch_cambridge_definition(word_en)
+        if definition_en:
+            await translate_definition_to_russian(definition_en)
+    except Exception as e:
+        logger.debug("Предзагрузка определения для '%s' не удалась: %s", word_en, e)
+
+API_RETRY_STATUSES = {502, 503, 504}
+API_RETRY_ATTEMPTS = 3
+API_RETRY_BACKOFF = 0.3
 
-def send_word_to_database(payload: Dict, chat_id: int) -> bool:
+async def api_request(method: str, url: str, **kwargs) -> httpx.Response:
+    """
+    Выполняет запрос к API сервера, повторяя его при ответах 502/503/504
+    с экспоненциальной задержкой (0.3 с, 0.6 с).
+    
+    Args:
+        method: HTTP-метод
+        url: Путь относительно BASE_API_URL
+        **kwargs: Параметры для httpx.AsyncClient.request
+    
+    Returns:
+        Ответ сервера (последней попытки)
+    """
+    for attempt in range(API_RETRY_ATTEMPTS):
+        response = await api_client.request(method, url, **kwargs)
+        if response.status_code not in API_RETRY_STATUSES or attempt == API_RETRY_ATTEMPTS - 1:
+            return response
+        logger.warning("Сервер ответил %s, повтор запроса %s", response.status_code, url)
+        await asyncio.sleep(API_RETRY_BACKOFF * 2 ** attempt)
+
+async def send_word_to_database(payload: Dict, chat_id: int) -> bool:
     """
     Отправляет данные слова на сервер.
     
@@ -138,12 +1044,7 @@ def send_word_to_database(payload: Dict, chat_id: int) -> bool:
     Returns:
         True при успешной отправке, False в случае ошибки
     """
-    url = f'{BASE_API_URL}/words'
-
-    headers = {
-        'X-API-Key': BOT_API_KEY,
-        'Content-Type': 'application/json'
-    }
+    url = 'words'
 
     server_payload = {
         'userId': chat_id,
@@ -152,30 +1053,41 @@ def send_word_to_database(payload: Dict, chat_id: int) -> bool:
         'definition': payload['definition']
     }
     
-    logger.info(f"Отправка на сервер URL: {url}, пользователя {chat_id}")
-    logger.info(f"Заголовки запроса: {headers}")
-    logger.info(f"Данные для отправки: {server_payload}")
+    logger.info("Отправка на сервер URL: %s/%s, пользователя %s", CONFIG.base_api_url, url, chat_id)
+    logger.debug("Данные для отправки: %s", server_payload)
     
     try:
-        response = requests.post(url, json=server_payload, headers=headers, timeout=15)
-        logger.info(f"Статус ответа: {response.status_code}")
+        response = await api_request(
+            'POST', url, content=orjson.dumps(server_payload), timeout=15
+        )
+        logger.info("Статус ответа: %s", response.status_code)
         
         if response.status_code == 401:
             logger.error("Ошибка 401: Неверный или отсутствующий API ключ")
             logger.error("Проверьте, что BOT_API_KEY в .env совпадает с ключом на сервере")
-        elif not response.ok:
-            logger.error(f"Ошибка сервера {response.status_code}: {response.text}")
+        elif not response.is_success:
+            logger.error("Ошибка сервера %s: %s", response.status_code, response.text)
             
         response.raise_for_status()
         logger.info("Слово успешно отправлено на сервер")
+        user_words_cache.pop(chat_id, None)
+        reminder_store.schedule(chat_id, next_reminder_ts())
         return True
-    except requests.exceptions.RequestException as e:
-        logger.error(f"Ошибка при отправке на сервер: {e}")
+    except httpx.HTTPError as e:
+        logger.error("Ошибка при отправке на сервер: %s", e)
         return False
 
+# Слова пользователей кэшируются на 5 минут; после успешного сохранения
+# нового слова запись пользователя удаляется из кэша
+user_words_cache = TTLCache(maxsize=10_000, ttl=300)
+user_words_inflight: Dict[int, asyncio.Future] = {}
+# Последний полученный список слов с его ETag: при неизменном списке
+# сервер отвечает 304 без тела, и список берется отсюда
+user_words_etags = TTLCache(maxsize=10_000, ttl=24 * 3600)
+
 async def get_user_words(user_id: int) -> List[Dict[str, Any]]:
     """
-    Получает слова пользователя из базы данных.
+    Получает слова пользователя из базы данных (с кэшированием).
     
     Args:
         user_id: ID пользователя в Telegram
@@ -183,64 +1095,123 @@ async def get_user_words(user_id: int) -> List[Dict[str, Any]]:
     Returns:
         Список слов с их данными
     """
+    cached = user_words_cache.get(user_id)
+    if cached is not None:
+        return cached
+    # Одновременные запросы слов одного пользователя выполняются один раз
+    return await single_flight(user_words_inflight, user_id, lambda: fetch_user_words(user_id))
+
+async def fetch_user_words(user_id: int) -> List[Dict[str, Any]]:
+    """
+    Запрашивает слова пользователя у сервера и сохраняет их в кэш.
+    
+    Args:
+        user_id: ID пользователя в Telegram
+    
+    Returns:
+        Список слов с их данными (пустой при ошибке)
+    """
     # ИЗМЕНЕНО: userId вместо user_id, убран параметр theme
-    url = f"{BASE_API_URL}/words?userId={user_id}"
-    headers = {'X-API-Key': BOT_API_KEY}
+    url = f"words?userId={user_id}"
+    headers = {}
+    validated = user_words_etags.get(user_id)
+    if validated is not None:
+        headers['If-None-Match'] = validated[0]
     
     try:
-        logger.info(f"Запрос слов для пользователя {user_id} с URL: {url}")
-        response = requests.get(url, headers=headers, timeout=10)
+        logger.info("Запрос слов для пользователя %s с URL: %s", user_id, url)
+        response = await api_request('GET', url, headers=headers)
+        if response.status_code == 304 and validated is not None:
+            logger.info("Список слов пользователя %s не изменился", user_id)
+            user_words_cache[user_id] = validated[1]
+            return validated[1]
         response.raise_for_status()
-        data = response.json()  # ИЗМЕНЕНО: переменная переименована для ясности
+        data = orjson.loads(response.content)  # ИЗМЕНЕНО: переменная переименована для ясности
         
         # ИЗМЕНЕНО: обработка нового формата ответа
         words_list = data.get('words', []) if isinstance(data, dict) else data
             
-        logger.info(f"Получено {len(words_list)} слов для пользователя {user_id}")
+        logger.info("Получено %s слов для пользователя %s", len(words_list), user_id)
+        user_words_cache[user_id] = words_list
+        etag = response.headers.get('ETag')
+        if etag:
+            user_words_etags[user_id] = (etag, words_list)
         return words_list
     except Exception as e:
-        logger.error(f"Ошибка получения слов из БД для пользователя {user_id}: {e}")
+        logger.error("Ошибка получения слов из БД для пользователя %s: %s", user_id, e)
         return []
 
-def generate_options(words: List[Dict], correct_value: str, field: str, count: int = 3) -> List[str]:
+# Поле слова, из которого берутся варианты ответов для каждого типа вопроса
+QUIZ_ANSWER_FIELDS = {'translation': 'word', 'definition': 'definition'}
+
+def build_option_pool(words: List[Dict], field: str) -> Dict[str, int]:
     """
-    Генерирует варианты ответов для теста, выбирая уникальные значения из списка слов.
+    Собирает уникальные значения поля для вариантов ответов теста.
     
     Args:
-        words: Список слов для выбора вариантов
-        correct_value: Правильный ответ
+        words: Список слов теста
         field: Поле для выбора значений ('word' или 'definition')
-        count: Количество неправильных вариантов
     
     Returns:
-        Список вариантов ответов (всегда 4 элемента)
+        Словарь: значение -> индекс первого слова с этим значением
     """
-    if not words or not correct_value:
-        return []
-    
-    # ИЗМЕНЕНО: обработка новых имен полей
-    all_values = []
-    for w in words:
-        # Проверяем наличие нужного поля в данных
-        if field in w and w[field] and str(w[field]).strip() != correct_value:
+    pool = {}
+    for i, w in enumerate(words):
+        if w.get(field):
             value = str(w[field]).strip()
             if len(value) > 1:  # Игнорируем слишком короткие значения
-                all_values.append(value)
+                pool.setdefault(value, i)
+    return pool
+
+def generate_options(pool: Dict[str, int], correct_idx: int, correct_value: str,
+                     count: int = 3) -> List[int]:
+    """
+    Генерирует варианты ответов для теста, выбирая неправильные варианты из пула.
+    Варианты хранятся индексами слов теста; отрицательное число -n означает
+    заполнитель «Вариант n».
     
-    # Удаляем дубликаты
-    all_values = list(set(all_values))
+    Args:
+        pool: Уникальные значения поля, собранные build_option_pool
+        correct_idx: Индекс слова с правильным ответом
+        correct_value: Правильный ответ
+        count: Количество неправильных вариантов
     
-    # Если недостаточно вариантов, создаем заполнители
-    if len(all_values) < count:
-        all_values.extend([f"Вариант {i+1}" for i in range(count - len(all_values))])
+    Returns:
+        Список индексов вариантов ответов (всегда 4 элемента)
+    """
+    if not correct_value:
+        return []
     
-    # Перемешиваем и берем нужное количество
-    random.shuffle(all_values)
-    options = [correct_value] + all_values[:count]
+    # Берем на один вариант больше и отбрасываем правильный — без копии пула
+    # за вычетом правильного ответа на каждый вопрос
+    excluded = pool.get(correct_value.strip())
+    indices = tuple(pool.values())
+    sample = random.sample(indices, min(count + 1, len(indices)))
+    picks = [i for i in sample if i != excluded][:count]
+    
+    # Если недостаточно вариантов, создаем заполнители
+    picks.extend(-(i + 1) for i in range(count - len(picks)))
     
-    # Перемешиваем варианты и гарантируем 4 варианта
+    # Перемешиваем варианты
+    options = [correct_idx] + picks
     random.shuffle(options)
-    return options[:4]
+    return options
+
+def option_text(quiz_pool: List[Dict], field: str, option: int) -> str:
+    """
+    Возвращает текст варианта ответа по его индексу.
+    
+    Args:
+        quiz_pool: Слова текущего теста
+        field: Поле слова с ответом ('word' или 'definition')
+        option: Индекс слова или отрицательный номер заполнителя
+    
+    Returns:
+        Текст варианта ответа
+    """
+    if option < 0:
+        return f"Вариант {-option}"
+    return str(quiz_pool[option][field]).strip()
 
 async def send_reminder(context: ContextTypes.DEFAULT_TYPE):
     """
@@ -250,7 +1221,7 @@ async def send_reminder(context: ContextTypes.DEFAULT_TYPE):
         context: Контекст бота с данными о задаче
     """
     job = context.job
-    chat_id = job.chat_id if job else (ADMIN_CHAT_ID if ADMIN_CHAT_ID else None)
+    chat_id = job.chat_id if job else (CONFIG.admin_chat_id if CONFIG.admin_chat_id else None)
     
     if not chat_id:
         logger.error("Не удалось определить chat_id для напоминания")
@@ -259,32 +1230,126 @@ async def send_reminder(context: ContextTypes.DEFAULT_TYPE):
     try:
         chat_id = int(chat_id)
     except (ValueError, TypeError):
-        logger.error(f"Некорректный chat_id для напоминания: {chat_id}")
+        logger.error("Некорректный chat_id для напоминания: %s", chat_id)
         return
     
+    # Ежедневное напоминание сразу переносим на следующий день
+    if job and job.name and job.name.startswith(REMINDER_JOB_PREFIX):
+        reminder_store.schedule(chat_id, next_reminder_ts())
+    
     # Проверяем, есть ли у пользователя слова для повторения
     try:
         words = await get_user_words(chat_id)
         if not words:
-            logger.info(f"У пользователя {chat_id} нет слов для повторения, напоминание не отправлено")
+            logger.info("У пользователя %s нет слов для повторения, напоминание не отправлено", chat_id)
             return
     except Exception as e:
-        logger.error(f"Ошибка проверки слов для пользователя {chat_id}: {e}")
+        logger.error("Ошибка проверки слов для пользователя %s: %s", chat_id, e)
         return
     
-    keyboard = [
-        [InlineKeyboardButton("✅ Проверить знания", callback_data="mode::quiz")]
-    ]
-    
     try:
         await context.bot.send_message(
             chat_id=chat_id,
             text="🌅 Не желаете повторить слова сегодня?",
-            reply_markup=InlineKeyboardMarkup(keyboard)
+            reply_markup=REMINDER_KEYBOARD
         )
-        logger.info(f"Напоминание отправлено пользователю {chat_id}")
+        logger.info("Напоминание отправлено пользователю %s", chat_id)
+    except Forbidden:
+        # Пользователь заблокировал бота: больше не напоминаем
+        reminder_store.remove(chat_id)
+        logger.info("Пользователь %s заблокировал бота, напоминания отключены", chat_id)
     except Exception as e:
-        logger.error(f"Ошибка отправки напоминания пользователю {chat_id}: {e}")
+        logger.error("Ошибка отправки напоминания пользователю %s: %s", chat_id, e)
+
+async def schedule_due_reminders(context: ContextTypes.DEFAULT_TYPE):
+    """
+    Ставит в JobQueue напоминания, срок которых наступает в ближайший час.
+    
+    Args:
+        context: Контекст бота
+    """
+    now = time.time()
+    for chat_id, due_ts in reminder_store.due_before(now + REMINDER_SCAN_INTERVAL):
+        name = f"{REMINDER_JOB_PREFIX}{chat_id}"
+        if context.job_queue.get_jobs_by_name(name):
+            continue
+        context.job_queue.run_once(
+            send_reminder,
+            max(0.0, due_ts - now),
+            chat_id=chat_id,
+            name=name
+        )
+
+# === СОСТОЯНИЕ ПОЛЬЗОВАТЕЛЯ ===
+
+@dataclass(slots=True)
+class QuizState:
+    """Состояние текущего теста пользователя."""
+    words: List[Dict[str, Any]]
+    questions: List[Dict[str, Any]]
+    idx: int = 0
+    score: int = 0
+
+@dataclass(slots=True)
+class UserSession:
+    """Состояние диалога пользователя (хранится в user_data['session'])."""
+    mode: Optional[str] = None
+    src: Optional[str] = None
+    dest: Optional[str] = None
+    words_queue: deque = field(default_factory=deque)
+    current_word: Optional[str] = None
+    pending_word_en: Optional[str] = None
+    pending_word_ru: Optional[str] = None
+    cambridge_definition_en: str = ''
+    cambridge_definition_ru: str = ''
+    definition_ru_task: Optional[asyncio.Task] = None
+    early_rewrite: bool = False
+    quiz: Optional[QuizState] = None
+    last_seen: float = field(default_factory=time.time)
+
+# Состояние пользователя, неактивного дольше часа, удаляется из памяти
+SESSION_TTL = 3600
+SESSION_SWEEP_INTERVAL = 1800
+
+SESSION_EXPIRED_TEXT = "Эта кнопка устарела. Начните сначала с помощью /start"
+
+def get_session(context: ContextTypes.DEFAULT_TYPE) -> UserSession:
+    """
+    Возвращает состояние пользователя, создавая его при первом обращении.
+    
+    Args:
+        context: Контекст бота
+    
+    Returns:
+        Объект UserSession из user_data
+    """
+    session = context.user_data.get('session')
+    if session is None:
+        session = context.user_data['session'] = UserSession()
+    return session
+
+async def touch_session(update: Update, context: ContextTypes.DEFAULT_TYPE):
+    """Отмечает время последней активности пользователя (до основных обработчиков)."""
+    if update.effective_user is not None:
+        get_session(context).last_seen = time.time()
+
+async def evict_stale_sessions(context: ContextTypes.DEFAULT_TYPE):
+    """
+    Удаляет user_data пользователей, неактивных дольше SESSION_TTL,
+    чтобы память бота не росла вместе с числом когда-либо писавших ему.
+    
+    Args:
+        context: Контекст задачи JobQueue
+    """
+    cutoff = time.time() - SESSION_TTL
+    stale = [
+        user_id for user_id, data in context.application.user_data.items()
+        if getattr(data.get('session'), 'last_seen', 0.0) < cutoff
+    ]
+    for user_id in stale:
+        context.application.drop_user_data(user_id)
+    if stale:
+        logger.info("Удалено неактивных сессий: %s", len(stale))
 
 # === ФУНКЦИИ РЕЖИМА ТЕСТИРОВАНИЯ ===
 
@@ -296,6 +1361,7 @@ async def start_quiz(update: Update, context: ContextTypes.DEFAULT_TYPE):
         update: Объект обновления от Telegram
         context: Контекст бота
     """
+    session = get_session(context)
     chat_id = update.effective_chat.id
     
     # Получаем слова пользователя
@@ -308,81 +1374,58 @@ async def start_quiz(update: Update, context: ContextTypes.DEFAULT_TYPE):
         )
         return
     
-    # Перемешиваем слова для случайного выбора
-    random.shuffle(words)
+    # Случайная выборка максимум из 40 слов без перемешивания всего списка
+    quiz_words = random.sample(words, min(40, len(words)))
+    logger.info("Сформирован набор из %s слов для теста пользователя %s", len(quiz_words), chat_id)
     
-    # Определяем сколько слов запросить
-    total_words = len(words)
-    quiz_words = words[:min(40, total_words)]  # Берем максимум 40 слов
-    logger.info(f"Сформирован набор из {len(quiz_words)} слов для теста пользователя {chat_id}")
+    # Пулы вариантов ответов строятся один раз на весь тест
+    word_pool = build_option_pool(quiz_words, 'word')
+    definition_pool = build_option_pool(quiz_words, 'definition')
     
-    # Формируем вопросы
+    # Формируем вопросы: слова и варианты хранятся индексами в quiz_words
     questions = []
     
     # Первые 5 слов для перевода (русский -> английский)
     # ИЗМЕНЕНО: используем новые имена полей
-    translation_words = [
-        w for w in quiz_words 
+    translation_idxs = [
+        i for i, w in enumerate(quiz_words)
         if w.get('word') and w.get('translation')
     ][:5]
     
-    for word in translation_words:
-        options = generate_options(quiz_words, word['word'], 'word')
+    for i in translation_idxs:
+        options = generate_options(word_pool, i, quiz_words[i]['word'])
         if len(options) >= 4:  # Убедимся, что есть достаточно вариантов
-            questions.append({
-                'type': 'translation',
-                'word': word['word'],
-                'translation': word['translation'],
-                'correct': word['word'],
-                'options': options
-            })
+            questions.append({'type': 'translation', 'idx': i, 'options': options})
     
     # Следующие 5 слов для определений (английский -> определение)
     # ИЗМЕНЕНО: используем новые имена полей
-    definition_words = [
-        w for w in quiz_words 
+    definition_idxs = [
+        i for i, w in enumerate(quiz_words)
         if w.get('word') and w.get('definition') and w['definition'].strip()
-    ][len(translation_words):len(translation_words)+5]
+    ][len(translation_idxs):len(translation_idxs)+5]
     
-    for word in definition_words:
+    for i in definition_idxs:
         # Генерируем варианты определений
-        options = generate_options(quiz_words, word['definition'], 'definition')
+        options = generate_options(definition_pool, i, quiz_words[i]['definition'])
         if len(options) >= 4:  # Убедимся, что есть достаточно вариантов
-            questions.append({
-                'type': 'definition',
-                'word': word['word'],
-                'definition': word['definition'],
-                'correct': word['definition'],
-                'options': options
-            })
+            questions.append({'type': 'definition', 'idx': i, 'options': options})
     
     # Если вопросов меньше 10, используем доступные
-    if len(questions) < 10 and len(quiz_words) > len(translation_words) + len(definition_words):
-        remaining_words = quiz_words[len(translation_words) + len(definition_words):]
-        for i, word in enumerate(remaining_words):
+    used = len(translation_idxs) + len(definition_idxs)
+    if len(questions) < 10 and len(quiz_words) > used:
+        for n, i in enumerate(range(used, len(quiz_words))):
             if len(questions) >= 10:
                 break
             
-            if i % 2 == 0 and word.get('word') and word.get('translation'):
-                options = generate_options(quiz_words, word['word'], 'word')
+            word = quiz_words[i]
+            if n % 2 == 0 and word.get('word') and word.get('translation'):
+                options = generate_options(word_pool, i, word['word'])
                 if len(options) >= 4:
-                    questions.append({
-                        'type': 'translation',
-                        'word': word['word'],
-                        'translation': word['translation'],
-                        'correct': word['word'],
-                        'options': options[:4]
-                    })
+                    questions.append({'type': 'translation', 'idx': i, 'options': options})
             elif word.get('word') and word.get('definition') and word['definition'].strip():
-                options = generate_options(quiz_words, word['definition'], 'definition')
+                options = generate_options(definition_pool, i, word['definition'])
                 if len(options) >= 4:
-                    questions.append({
-                        'type': 'definition',
-                        'word': word['word'],
-                        'definition': word['definition'],
-                        'correct': word['definition'],
-                        'options': options[:4]
-                    })
+                    questions.append({'type': 'definition', 'idx': i, 'options': options})
     
     # Если все еще нет вопросов
     if not questions:
@@ -390,19 +1433,17 @@ async def start_quiz(update: Update, context: ContextTypes.DEFAULT_TYPE):
             chat_id=chat_id,
             text="Недостаточно данных для создания теста. Пожалуйста, добавьте больше слов с переводами и определениями."
         )
-        logger.warning(f"Не удалось создать вопросы для теста пользователя {chat_id}")
+        logger.warning("Не удалось создать вопросы для теста пользователя %s", chat_id)
         return
     
     # Перемешиваем вопросы
     random.shuffle(questions)
     
     # Сохраняем состояние теста
-    context.user_data['quiz_questions'] = questions
-    context.user_data['current_question'] = 0
-    context.user_data['quiz_score'] = 0
-    context.user_data['mode'] = 'quiz_active'
+    session.quiz = QuizState(words=quiz_words, questions=questions)
+    session.mode = 'quiz_active'
     
-    logger.info(f"Тест начат для пользователя {chat_id} с {len(questions)} вопросами")
+    logger.info("Тест начат для пользователя %s с %s вопросами", chat_id, len(questions))
     # Отправляем первый вопрос
     await send_question(context, chat_id)
 
@@ -414,44 +1455,41 @@ async def send_question(context: ContextTypes.DEFAULT_TYPE, chat_id: int):
         context: Контекст бота
         chat_id: ID чата пользователя
     """
-    questions = context.user_data.get('quiz_questions', [])
-    current_idx = context.user_data.get('current_question', 0)
+    session = get_session(context)
+    state = session.quiz
     
-    if current_idx >= len(questions):
+    if state is None or state.idx >= len(state.questions):
         await finish_quiz(context, chat_id)
         return
     
-    question = questions[current_idx]
+    current_idx = state.idx
+    question = state.questions[current_idx]
+    quiz_pool = state.words
+    word = quiz_pool[question['idx']]
+    field = QUIZ_ANSWER_FIELDS[question['type']]
     
     # Формируем текст вопроса и варианты
+    # Пользовательский текст экранируется для MarkdownV2 заранее
     if question['type'] == 'translation':
-        text = f"🔤 Как переводится слово:\n\n**{question['translation']}**"
+        text = f"🔤 Как переводится слово:\n\n*{escape_markdown(word['translation'], version=2)}*"
     else:  # definition
-        text = f"📖 Что означает слово:\n\n**{question['word']}**"
+        text = f"📖 Что означает слово:\n\n*{escape_markdown(word['word'], version=2)}*"
     
     # Создаем кнопки
     keyboard = []
-    for idx, option in enumerate(question['options']):
+    for idx, option_idx in enumerate(question['options']):
+        option = option_text(quiz_pool, field, option_idx)
         display_text = (option[:100] + '...') if len(option) > 100 else option
         callback_data = f"quiz_answer::{current_idx}:{idx}"
         keyboard.append([InlineKeyboardButton(display_text, callback_data=callback_data)])
     
     # Отправляем сообщение
-    try:
-        await context.bot.send_message(
-            chat_id=chat_id,
-            text=text,
-            reply_markup=InlineKeyboardMarkup(keyboard),
-            parse_mode='Markdown'
-        )
-    except Exception as e:
-        # Если текст слишком длинный для Markdown или содержит спецсимволы
-        await context.bot.send_message(
-            chat_id=chat_id,
-            text=text.replace('**', '').replace('*', ''),
-            reply_markup=InlineKeyboardMarkup(keyboard)
-        )
-        logger.warning(f"Ошибка при отправке сообщения с Markdown: {e}")
+    await context.bot.send_message(
+        chat_id=chat_id,
+        text=text,
+        reply_markup=InlineKeyboardMarkup(keyboard),
+        parse_mode=ParseMode.MARKDOWN_V2
+    )
 
 async def handle_quiz_answer(update: Update, context: ContextTypes.DEFAULT_TYPE):
     """
@@ -461,43 +1499,50 @@ async def handle_quiz_answer(update: Update, context: ContextTypes.DEFAULT_TYPE)
         update: Объект обновления от Telegram
         context: Контекст бота
     """
+    session = get_session(context)
     query = update.callback_query
     await query.answer()
     chat_id = query.message.chat_id
     
     # Извлекаем номер вопроса и индекс выбранного варианта
-    parts = query.data.split("::")[1].split(":")
-    question_idx = int(parts[0])
-    option_idx = int(parts[1])
+    question_part, _, option_part = query.data.partition("::")[2].partition(":")
+    question_idx = int(question_part)
+    option_idx = int(option_part)
     
-    questions = context.user_data.get('quiz_questions', [])
+    state = session.quiz
+    if state is None:  # кнопка осталась от сессии до /start, перезапуска или вытеснения
+        await query.edit_message_text(SESSION_EXPIRED_TEXT)
+        return
     
-    if question_idx >= len(questions):
+    if question_idx >= len(state.questions):
         await finish_quiz(context, chat_id)
         return
     
-    question = questions[question_idx]
-    selected_option = question['options'][option_idx]
-    is_correct = (selected_option.strip() == question['correct'].strip())
+    question = state.questions[question_idx]
+    # Правильный вариант — индекс самого слова вопроса
+    is_correct = question['options'][option_idx] == question['idx']
     
     if is_correct:
-        context.user_data['quiz_score'] = context.user_data.get('quiz_score', 0) + 1
-        feedback = "✅ **Верно!** Отлично!"
+        state.score += 1
+        feedback = "✅ *Верно\\!* Отлично\\!"
     else:
-        feedback = f"❌ **Неверно.**\nПравильный ответ: **{question['correct']}**"
+        correct = option_text(
+            state.words, QUIZ_ANSWER_FIELDS[question['type']], question['idx']
+        )
+        feedback = f"❌ *Неверно\\.*\nПравильный ответ: *{escape_markdown(correct, version=2)}*"
     
     # Отправляем обратную связь
     await context.bot.send_message(
         chat_id=chat_id,
         text=feedback,
-        parse_mode='Markdown'
+        parse_mode=ParseMode.MARKDOWN_V2
     )
     
     # Переходим к следующему вопросу
-    context.user_data['current_question'] = question_idx + 1
+    state.idx = question_idx + 1
     
     # Отправляем следующий вопрос или завершаем тест
-    if context.user_data['current_question'] < len(questions):
+    if state.idx < len(state.questions):
         await send_question(context, chat_id)
     else:
         await finish_quiz(context, chat_id)
@@ -510,47 +1555,54 @@ async def finish_quiz(context: ContextTypes.DEFAULT_TYPE, chat_id: int):
         context: Контекст бота
         chat_id: ID чата пользователя
     """
-    score = context.user_data.get('quiz_score', 0)
-    total = len(context.user_data.get('quiz_questions', []))
+    session = get_session(context)
+    state = session.quiz
+    session.quiz = None
+    score = state.score if state else 0
+    total = len(state.questions) if state else 0
     
     # Формируем сообщение с результатами
-    message = "🎉 **Тест завершен!**\n\n"
-    message += f"✅ Правильных ответов: {score} из {total}\n"
-    message += "Отличная работа! Ты на шаг ближе к цели!\n"
-    message += "💪Регулярная практика приведет к успеху! Увидимся завтра! 🌟"
+    message = "🎉 *Тест завершен\\!*\n\n"
+    message += escape_markdown(
+        f"✅ Правильных ответов: {score} из {total}\n"
+        "Отличная работа! Ты на шаг ближе к цели!\n"
+        "💪Регулярная практика приведет к успеху! Увидимся завтра! 🌟",
+        version=2
+    )
     
-    # Отправляем изображение завершения, если оно существует
-    if os.path.exists(END_TEST_IMAGE):
-        try:
-            with open(END_TEST_IMAGE, 'rb') as photo:
-                await context.bot.send_photo(
-                    chat_id=chat_id,
-                    photo=photo,
-                    caption=message,
-                    parse_mode='Markdown'
-                )
-        except Exception as e:
-            logger.error(f"Ошибка отправки изображения завершения: {e}")
-            await context.bot.send_message(
-                chat_id=chat_id,
-                text=message,
-                parse_mode='Markdown'
-            )
-    else:
+    # Отправляем изображение завершения, если оно есть
+    if not await send_cached_photo(context, chat_id, END_TEST_IMAGE, message,
+                                   parse_mode=ParseMode.MARKDOWN_V2):
         await context.bot.send_message(
             chat_id=chat_id,
             text=message,
-            parse_mode='Markdown'
+            parse_mode=ParseMode.MARKDOWN_V2
         )
     
-    # Очищаем данные теста
-    for key in ['quiz_questions', 'current_question', 'quiz_score']:
-        context.user_data.pop(key, None)
-    context.user_data['mode'] = 'idle'
-    logger.info(f"Тест завершен для пользователя {chat_id}. Результат: {score}/{total}")
+    # Возвращаемся в обычный режим
+    session.mode = 'idle'
+    logger.info("Тест завершен для пользователя %s. Результат: %s/%s", chat_id, score, total)
 
 # === ОСНОВНЫЕ ОБРАБОТЧИКИ ===
 
+async def show_message(context: ContextTypes.DEFAULT_TYPE, chat_id: int, text: str,
+                       query=None, **kwargs):
+    """
+    Показывает сообщение: при нажатии кнопки редактирует сообщение с этой
+    кнопкой, иначе отправляет новое.
+    
+    Args:
+        context: Контекст бота
+        chat_id: ID чата пользователя
+        text: Текст сообщения
+        query: CallbackQuery нажатой кнопки или None
+        **kwargs: reply_markup, parse_mode и другие параметры сообщения
+    """
+    if query is not None:
+        await query.edit_message_text(text=text, **kwargs)
+    else:
+        await context.bot.send_message(chat_id=chat_id, text=text, **kwargs)
+
 async def start(update: Update, context: ContextTypes.DEFAULT_TYPE):
     """
     Приветственное сообщение с выбором режима работы.
@@ -560,30 +1612,22 @@ async def start(update: Update, context: ContextTypes.DEFAULT_TYPE):
         context: Контекст бота
     """
     context.user_data.clear()
+    session = get_session(context)
     chat_id = update.effective_chat.id
+    # Пользователи, сохранившие слова до появления таблицы напоминаний,
+    # получают запись при следующем /start
+    reminder_store.ensure(chat_id, next_reminder_ts())
 
-    welcome_path = 'welcome.jpg'
     caption = 'Я помогу вам учить английский! Выберите действие.'
-    if os.path.exists(welcome_path):
-        try:
-            with open(welcome_path, 'rb') as f:
-                await context.bot.send_photo(chat_id=chat_id, photo=f, caption=caption)
-        except Exception as e:
-            logger.error(f"Ошибка отправки приветственного изображения: {e}")
-            await context.bot.send_message(chat_id=chat_id, text=caption)
-    else:
+    if not await send_cached_photo(context, chat_id, WELCOME_IMAGE, caption):
         await context.bot.send_message(chat_id=chat_id, text=caption)
 
-    keyboard = [
-        [InlineKeyboardButton("Добавить слово", callback_data="mode::add")],
-        [InlineKeyboardButton("Проверить знания", callback_data="mode::quiz")]
-    ]
     await context.bot.send_message(
         chat_id=chat_id,
         text='Выберите действие:',
-        reply_markup=InlineKeyboardMarkup(keyboard)
+        reply_markup=MODE_KEYBOARD
     )
-    context.user_data['mode'] = 'choose_mode'
+    session.mode = 'choose_mode'
 
 
 async def add_word(update: Update, context: ContextTypes.DEFAULT_TYPE):
@@ -594,17 +1638,15 @@ async def add_word(update: Update, context: ContextTypes.DEFAULT_TYPE):
         update: Объект обновления от Telegram
         context: Контекст бота
     """
+    session = get_session(context)
     chat_id = update.effective_chat.id
-    keyboard = [
-        [InlineKeyboardButton("Русское слово", callback_data="lang::ru")],
-        [InlineKeyboardButton("Английское слово", callback_data="lang::en")]
-    ]
-    await context.bot.send_message(
-        chat_id=chat_id,
-        text='Выберите язык добавляемого слова:',
-        reply_markup=InlineKeyboardMarkup(keyboard)
+    # Меню выбора заменяет сообщение с нажатой кнопкой
+    await show_message(
+        context, chat_id, 'Выберите язык добавляемого слова:',
+        query=update.callback_query,
+        reply_markup=LANG_KEYBOARD
     )
-    context.user_data['mode'] = 'choose_lang'
+    session.mode = 'choose_lang'
 
 
 async def process_next_word(context: ContextTypes.DEFAULT_TYPE, chat_id: int):
@@ -615,37 +1657,38 @@ async def process_next_word(context: ContextTypes.DEFAULT_TYPE, chat_id: int):
         context: Контекст бота
         chat_id: ID чата пользователя
     """
-    words_queue = context.user_data.get('words_queue', [])
-    if not words_queue:
-        keyboard = [
-            [InlineKeyboardButton("Добавить слово", callback_data="post_add")],
-            [InlineKeyboardButton("Проверить знания", callback_data="post_quiz")],
-            [InlineKeyboardButton("Завершить программу", callback_data="post_finish")]
-        ]
+    session = get_session(context)
+    words_queue = session.words_queue
+
+    # Непереводимые слова пропускаем в цикле до первого переведенного
+    while words_queue:
+        word = words_queue[0]
+        src = session.src
+        dest = session.dest
+        translations = await get_translations(word, src, dest)
+        if translations:
+            break
         await context.bot.send_message(
             chat_id=chat_id,
-            text="✅ Все слова добавлены! Хотите сделать что-то ещё?",
-            reply_markup=InlineKeyboardMarkup(keyboard)
+            text=f"Не удалось перевести слово: {word}. Пропускаем."
         )
-        context.user_data['mode'] = 'post_actions'
-        return
-
-    word = words_queue[0]
-    context.user_data['current_word'] = word
-    src = context.user_data['src']
-    dest = context.user_data['dest']
-
-    translations = await get_translations(word, src, dest)
-    if not translations:
+        words_queue.popleft()
+    else:
         await context.bot.send_message(
             chat_id=chat_id,
-            text=f"Не удалось перевести слово: {word}. Пропускаем."
+            text="✅ Все слова добавлены! Хотите сделать что-то ещё?",
+            reply_markup=POST_ACTIONS_KEYBOARD
         )
-        context.user_data['words_queue'] = words_queue[1:]
-        await process_next_word(context, chat_id)
+        session.mode = 'post_actions'
         return
 
-    unique_variants = list(dict.fromkeys(translations.values()))
+    session.current_word = word
+
+    # Варианты, отличающиеся только регистром или пробелами, показываем один раз
+    variants = {}
+    for tr in translations.values():
+        variants.setdefault(tr.strip().casefold(), tr.strip())
+    unique_variants = list(variants.values())
     keyboard = []
     for tr in unique_variants:
         keyboard.append([InlineKeyboardButton(tr, callback_data=f"select_trans::{tr}")])
@@ -657,11 +1700,19 @@ async def process_next_word(context: ContextTypes.DEFAULT_TYPE, chat_id: int):
         text=f"Выберите перевод для «{word}»:",
         reply_markup=InlineKeyboardMarkup(keyboard)
     )
-    context.user_data['mode'] = 'selecting_translation'
+    session.mode = 'selecting_translation'
+
+    # Пока пользователь выбирает перевод, в фоне прогреваем кэши: определения
+    # для возможных английских вариантов и переводы следующего слова
+    candidates_en = unique_variants if dest == 'en' else [word]
+    for word_en in candidates_en:
+        context.application.create_task(prefetch_definition(word_en))
+    if len(words_queue) > 1:
+        context.application.create_task(get_translations(words_queue[1], src, dest))
 
 
 async def handle_word_definition_selection(chat_id: int, context: ContextTypes.DEFAULT_TYPE, 
-                                          word_en: str, word_ru: str):
+                                          word_en: str, word_ru: str, query=None):
     """
     Предлагает выбрать вариант определения для слова.
     Получает определение из Cambridge Dictionary и предлагает варианты.
@@ -671,33 +1722,37 @@ async def handle_word_definition_selection(chat_id: int, context: ContextTypes.D
         context: Контекст бота
         word_en: Английское слово
         word_ru: Русский перевод
+        query: CallbackQuery выбора перевода (его сообщение будет заменено)
     """
-    definition_en = fetch_cambridge_definition(word_en)
+    session = get_session(context)
+    definition_en = await fetch_cambridge_definition(word_en)
 
-    context.user_data['pending_word_en'] = word_en
-    context.user_data['pending_word_ru'] = word_ru
-    context.user_data['cambridge_definition_en'] = definition_en
+    session.pending_word_en = word_en
+    session.pending_word_ru = word_ru
+    session.cambridge_definition_en = definition_en
 
     def truncate(text: str, max_len=40) -> str:
         """Обрезает текст для отображения в кнопках."""
         return (text[:max_len] + '…') if len(text) > max_len else text
 
     options = []
+    session.cambridge_definition_ru = ""
+    session.definition_ru_task = None
     if definition_en:
         en_label = truncate(definition_en)
         options.append((en_label, "orig"))
-        try:
-            # Переводим определение на русский
-            result = await google_translator.translate(definition_en, src='en', dest='ru')
-            definition_ru = result.text.strip()
-            context.user_data['cambridge_definition_ru'] = definition_ru
-            ru_label = truncate(definition_ru)
-            options.append((ru_label, "trans"))
-        except Exception as e:
-            logger.warning("Не удалось перевести определение: %s", e)
-            context.user_data['cambridge_definition_ru'] = ""
-    else:
-        context.user_data['cambridge_definition_ru'] = ""
+        if CONFIG.google_api_key or CONFIG.deepl_api_key:
+            # Перевод определения не задерживает клавиатуру: он выполняется
+            # в фоне и ожидается, только если пользователь выберет его
+            task = context.application.create_task(translate_definition_to_russian(definition_en))
+            if task.done() and not task.cancelled() and task.exception() is None:
+                # Перевод уже был в кэше (например, после предзагрузки)
+                session.cambridge_definition_ru = task.result()
+                if session.cambridge_definition_ru:
+                    options.append((truncate(session.cambridge_definition_ru), "trans"))
+            elif not task.done():
+                session.definition_ru_task = task
+                options.append(("🇷🇺 Перевод определения", "trans"))
 
     options.append(("✏️ Своё определение", "custom"))
 
@@ -708,17 +1763,58 @@ async def handle_word_definition_selection(chat_id: int, context: ContextTypes.D
     keyboard.append([InlineKeyboardButton("🔁 Переписать слово", callback_data="action::rewrite")])
     keyboard.append([InlineKeyboardButton("⏭ Пропустить", callback_data="action::skip")])
 
-    msg = f"Слово: **{word_en}**\nПеревод: **{word_ru}**\n\nВыберите определение:"
+    msg = (
+        f"Слово: *{escape_markdown(word_en, version=2)}*\n"
+        f"Перевод: *{escape_markdown(word_ru, version=2)}*\n\nВыберите определение:"
+    )
     if not definition_en:
-        msg += "\n\n⚠️ Определение в Cambridge не найдено."
+        msg += "\n\n⚠️ Определение в Cambridge не найдено\\."
 
-    await context.bot.send_message(
-        chat_id=chat_id,
-        text=msg,
+    await show_message(
+        context, chat_id, msg,
+        query=query,
         reply_markup=InlineKeyboardMarkup(keyboard),
-        parse_mode='Markdown'
+        parse_mode=ParseMode.MARKDOWN_V2
+    )
+    session.mode = 'choosing_definition'
+
+
+def split_words(text: str) -> List[str]:
+    """
+    Разбивает ввод пользователя на слова без пустых элементов и повторов.
+    
+    Args:
+        text: Текст сообщения
+    
+    Returns:
+        Список слов в порядке ввода
+    """
+    return list(dict.fromkeys(w for w in map(str.strip, WORD_SPLIT_RE.split(text)) if w))
+
+
+async def save_word(context: ContextTypes.DEFAULT_TYPE, chat_id: int, payload: Dict, ack_text: str,
+                    query=None):
+    """
+    Сохраняет слово на сервере, одновременно отправляя пользователю
+    подтверждение; при ошибке сохранения отправляет предупреждение.
+    
+    Args:
+        context: Контекст бота
+        chat_id: ID чата пользователя
+        payload: Данные слова для сохранения
+        ack_text: Текст подтверждения
+        query: CallbackQuery выбора определения (его сообщение будет заменено)
+    """
+    success, _ = await asyncio.gather(
+        send_word_to_database(payload, chat_id),
+        show_message(context, chat_id, ack_text, query=query)
     )
-    context.user_data['mode'] = 'choosing_definition'
+    if not success:
+        await context.bot.send_message(
+            chat_id=chat_id,
+            text=f"⚠️ Слово «{payload['word_en']}» не удалось отправить на сервер."
+        )
+        logger.error("Не удалось отправить слово: %s", payload)
 
 
 async def request_rewrite_words(update: Update, context: ContextTypes.DEFAULT_TYPE, chat_id: int, early_rewrite: bool = False):
@@ -731,12 +1827,14 @@ async def request_rewrite_words(update: Update, context: ContextTypes.DEFAULT_TY
         chat_id: ID чата пользователя
         early_rewrite: Флаг для переписывания на этапе выбора перевода
     """
-    context.user_data['mode'] = 'await_rewrite_words'
-    context.user_data['early_rewrite'] = early_rewrite
-    
-    await context.bot.send_message(
-        chat_id=chat_id, 
-        text="✏️ Введите исправленное слово или несколько слов через запятую (как при первом вводе):"
+    session = get_session(context)
+    session.mode = 'await_rewrite_words'
+    session.early_rewrite = early_rewrite
+    
+    await show_message(
+        context, chat_id,
+        "✏️ Введите исправленное слово или несколько слов через запятую (как при первом вводе):",
+        query=update.callback_query
     )
 
 
@@ -748,25 +1846,28 @@ async def handle_text(update: Update, context: ContextTypes.DEFAULT_TYPE):
         update: Объект обновления от Telegram
         context: Контекст бота
     """
+    session = get_session(context)
     chat_id = update.effective_chat.id
     text = update.message.text.strip()
-    mode = context.user_data.get('mode')
+    mode = session.mode
 
     # Обработка переписывания слов
     if mode == 'await_rewrite_words':
-        words = [w.strip() for w in text.replace('\n', ',').split(',') if w.strip()]
+        words = split_words(text)
         if not words:
             await context.bot.send_message(chat_id=chat_id, text="Не удалось извлечь слова. Попробуйте снова.")
             return
         
         # Удаляем текущее слово из очереди
-        words_queue = context.user_data.get('words_queue', [])
-        if words_queue:
-            words_queue = words_queue[1:]
+        new_queue = session.words_queue
+        if new_queue:
+            new_queue.popleft()
         
         # Добавляем новые слова в начало очереди
-        new_queue = words + words_queue
-        context.user_data['words_queue'] = new_queue
+        new_queue.extendleft(reversed(words))
+        context.application.create_task(
+            pretranslate_words(words, session.src, session.dest)
+        )
         
         await context.bot.send_message(
             chat_id=chat_id, 
@@ -774,8 +1875,8 @@ async def handle_text(update: Update, context: ContextTypes.DEFAULT_TYPE):
         )
         
         # Если это раннее переписывание (на этапе перевода), возвращаемся к выбору перевода
-        if context.user_data.get('early_rewrite', False):
-            context.user_data['early_rewrite'] = False
+        if session.early_rewrite:
+            session.early_rewrite = False
             await process_next_word(context, chat_id)
         else:
             # Иначе продолжаем с определением для первого нового слова
@@ -784,20 +1885,25 @@ async def handle_text(update: Update, context: ContextTypes.DEFAULT_TYPE):
 
     # Прием слов для добавления
     if mode == 'waiting_words':
-        words = [w.strip() for w in text.replace('\n', ',').split(',') if w.strip()]
+        words = split_words(text)
         if not words:
             await context.bot.send_message(chat_id=chat_id, text="Не удалось извлечь слова. Попробуйте снова.")
             return
-        context.user_data['words_queue'] = words
+        session.words_queue = deque(words)
+        # Весь список переводится одним пакетом в фоне; первое слово
+        # присоединяется к тому же запросу DeepL
+        context.application.create_task(
+            pretranslate_words(words, session.src, session.dest)
+        )
         await process_next_word(context, chat_id)
         return
 
     # Прием пользовательского перевода
     if mode == 'await_custom_translation':
-        word = context.user_data['current_word']
+        word = session.current_word
         translation = text
-        src = context.user_data['src']
-        dest = context.user_data['dest']
+        src = session.src
+        dest = session.dest
         word_en = translation if dest == 'en' else word
         word_ru = word if src == 'ru' else translation
         await handle_word_definition_selection(chat_id, context, word_en, word_ru)
@@ -805,8 +1911,8 @@ async def handle_text(update: Update, context: ContextTypes.DEFAULT_TYPE):
 
     # Прием пользовательского определения
     if mode == 'await_custom_definition':
-        word_en = context.user_data['pending_word_en']
-        word_ru = context.user_data['pending_word_ru']
+        word_en = session.pending_word_en
+        word_ru = session.pending_word_ru
         custom_def = text
         payload = {
             'word_en': word_en,
@@ -815,22 +1921,12 @@ async def handle_text(update: Update, context: ContextTypes.DEFAULT_TYPE):
         }
         
         # Отправляем данные на сервер
-        success = send_word_to_database(payload, chat_id)
-        if success:
-            await context.bot.send_message(
-                chat_id=chat_id,
-                text=f"✅ Слово «{word_en}» сохранено с вашим определением!"
-            )
-        else:
-            await context.bot.send_message(
-                chat_id=chat_id,
-                text=f"⚠️ Слово «{word_en}» сохранено локально, но не отправлено на сервер."
-            )
-            logger.error("Не удалось отправить слово с пользовательским определением: %s", payload)
+        await save_word(context, chat_id, payload, f"✅ Слово «{word_en}» принято с вашим определением!")
         
         # Переходим к следующему слову
-        words_queue = context.user_data.get('words_queue', [])
-        context.user_data['words_queue'] = words_queue[1:] if words_queue else []
+        words_queue = session.words_queue
+        if words_queue:
+            words_queue.popleft()
         await process_next_word(context, chat_id)
         return
 
@@ -846,9 +1942,9 @@ async def handle_text(update: Update, context: ContextTypes.DEFAULT_TYPE):
     )
 
 
-async def callback_query_handler(update: Update, context: ContextTypes.DEFAULT_TYPE):
+async def handle_mode_callback(update: Update, context: ContextTypes.DEFAULT_TYPE):
     """
-    Обрабатывает все нажатия кнопок.
+    Обрабатывает выбор режима работы (mode::add / mode::quiz).
     
     Args:
         update: Объект обновления от Telegram
@@ -856,153 +1952,333 @@ async def callback_query_handler(update: Update, context: ContextTypes.DEFAULT_T
     """
     query = update.callback_query
     await query.answer()
-    data = query.data
-    chat_id = query.message.chat_id
 
-    # Обработка режима викторины
-    if data == "mode::quiz":
+    if query.data == "mode::quiz":
         await start_quiz(update, context)
-        return
+    else:
+        await add_word(update, context)
+
+
+async def handle_post_callback(update: Update, context: ContextTypes.DEFAULT_TYPE):
+    """
+    Обрабатывает завершающее меню после добавления слов (post_*).
+    
+    Args:
+        update: Объект обновления от Telegram
+        context: Контекст бота
+    """
+    query = update.callback_query
+    await query.answer()
+    data = query.data
 
-    # Обработка завершающего меню
     if data == "post_add":
         context.user_data.clear()
         await add_word(update, context)
-        return
-    if data == "post_quiz":
+    elif data == "post_quiz":
         await start_quiz(update, context)
-        return
-    if data == "post_finish":
+    else:  # post_finish
         context.user_data.clear()
-        await context.bot.send_message(chat_id=chat_id, text="👋 До свидания! Чтобы начать снова, нажмите /start.")
-        return
+        await query.edit_message_text("👋 До свидания! Чтобы начать снова, нажмите /start.")
 
-    # Выбор режима
-    if data == "mode::add":
-        await add_word(update, context)
+
+async def handle_lang_callback(update: Update, context: ContextTypes.DEFAULT_TYPE):
+    """
+    Обрабатывает выбор языка добавляемых слов (lang::ru / lang::en).
+    
+    Args:
+        update: Объект обновления от Telegram
+        context: Контекст бота
+    """
+    session = get_session(context)
+    query = update.callback_query
+    await query.answer()
+
+    lang = query.data.partition("::")[2]
+    session.src = lang
+    session.dest = 'en' if lang == 'ru' else 'ru'
+    session.mode = 'waiting_words'
+    await query.edit_message_text("🔤 Введите одно или несколько слов через запятую:")
+
+
+async def handle_select_trans_callback(update: Update, context: ContextTypes.DEFAULT_TYPE):
+    """
+    Обрабатывает выбор перевода слова (select_trans::<перевод>|custom).
+    
+    Args:
+        update: Объект обновления от Telegram
+        context: Контекст бота
+    """
+    session = get_session(context)
+    query = update.callback_query
+    await query.answer()
+    chat_id = query.message.chat_id
+
+    selected = query.data.partition("::")[2]
+    word = session.current_word
+    src = session.src
+    dest = session.dest
+    if word is None:  # кнопка осталась от сессии до /start или перезапуска
+        await query.edit_message_text(SESSION_EXPIRED_TEXT)
         return
 
-    # Выбор языка
-    if data in ("lang::ru", "lang::en"):
-        lang = data.split("::")[1]
-        context.user_data['src'] = lang
-        context.user_data['dest'] = 'en' if lang == 'ru' else 'ru'
-        context.user_data['mode'] = 'waiting_words'
-        await context.bot.send_message(chat_id=chat_id, text="🔤 Введите одно или несколько слов через запятую:")
+    if selected == "custom":
+        session.mode = 'await_custom_translation'
+        await query.edit_message_text(f"✏️ Введите свой перевод для «{word}»:")
         return
 
-    # Выбор перевода
-    if data.startswith("select_trans::"):
-        selected = data.split("::", 1)[1]
-        word = context.user_data['current_word']
-        src = context.user_data['src']
-        dest = context.user_data['dest']
+    translation = selected
+    word_en = translation if dest == 'en' else word
+    word_ru = word if src == 'ru' else translation
+    await handle_word_definition_selection(chat_id, context, word_en, word_ru, query=query)
 
-        if selected == "custom":
-            context.user_data['mode'] = 'await_custom_translation'
-            await context.bot.send_message(chat_id=chat_id, text="✏️ Введите свой перевод:")
-            return
-        else:
-            translation = selected
-            word_en = translation if dest == 'en' else word
-            word_ru = word if src == 'ru' else translation
-            await handle_word_definition_selection(chat_id, context, word_en, word_ru)
-            return
 
-    # Выбор определения
-    if data.startswith("def_choice::"):
-        choice = data.split("::", 1)[1]
-        word_en = context.user_data['pending_word_en']
-        word_ru = context.user_data['pending_word_ru']
+async def handle_def_choice_callback(update: Update, context: ContextTypes.DEFAULT_TYPE):
+    """
+    Обрабатывает выбор определения (def_choice::orig|trans|custom).
+    
+    Args:
+        update: Объект обновления от Telegram
+        context: Контекст бота
+    """
+    session = get_session(context)
+    query = update.callback_query
+    await query.answer()
+    chat_id = query.message.chat_id
 
-        if choice == "custom":
-            context.user_data['mode'] = 'await_custom_definition'
-            await context.bot.send_message(
-                chat_id=chat_id,
-                text="✏️ Введите своё определение для слова:"
-            )
-            return
-            
-        if choice == "orig":
-            definition = context.user_data.get('cambridge_definition_en', '')
-        elif choice == "trans":
-            definition = context.user_data.get('cambridge_definition_ru', '')
-        else:
-            return
+    choice = query.data.partition("::")[2]
+    word_en = session.pending_word_en
+    word_ru = session.pending_word_ru
+    if word_en is None:  # кнопка осталась от сессии до /start или перезапуска
+        await query.edit_message_text(SESSION_EXPIRED_TEXT)
+        return
 
-        payload = {
-            'word_en': word_en,
-            'word_ru': word_ru,
-            'definition': definition,
-        }
+    if choice == "custom":
+        session.mode = 'await_custom_definition'
+        await query.edit_message_text(f"✏️ Введите своё определение для слова «{word_en}»:")
+        return
         
-        # Отправляем данные на сервер
-        success = send_word_to_database(payload, chat_id)
-        if success:
+    if choice == "orig":
+        definition = session.cambridge_definition_en
+    elif choice == "trans":
+        definition = session.cambridge_definition_ru
+        if not definition and session.definition_ru_task is not None:
+            try:
+                definition = await session.definition_ru_task
+            except Exception as e:
+                logger.warning("Не удалось перевести определение: %s", e)
+                definition = ""
+            session.cambridge_definition_ru = definition
+        if not definition:
             await context.bot.send_message(
                 chat_id=chat_id,
-                text=f"✅ Слово «{word_en}» сохранено!"
+                text="⚠️ Не удалось перевести определение. Выберите другой вариант."
             )
-        else:
-            await context.bot.send_message(
-                chat_id=chat_id,
-                text=f"⚠️ Слово «{word_en}» сохранено локально, но не отправлено на сервер."
-            )
-            logger.error("Не удалось отправить слово: %s", payload)
-        
-        words_queue = context.user_data.get('words_queue', [])
-        context.user_data['words_queue'] = words_queue[1:] if words_queue else []
-        await process_next_word(context, chat_id)
+            return
+    else:
         return
 
-    # Действия с словом
-    if data.startswith("action::"):
-        action = data.split("::")[1]
-        
-        if action == "rewrite_early":
-            await request_rewrite_words(update, context, chat_id, early_rewrite=True)
-            return
-            
-        if action == "rewrite":
-            await request_rewrite_words(update, context, chat_id)
-            return
-            
-        elif action == "skip":
-            words_queue = context.user_data.get('words_queue', [])
-            if words_queue:
-                skipped_word = words_queue[0]
-                context.user_data['words_queue'] = words_queue[1:]
-                await context.bot.send_message(chat_id=chat_id, text=f"⏭ Слово «{skipped_word}» пропущено.")
-            await process_next_word(context, chat_id)
-            return
+    payload = {
+        'word_en': word_en,
+        'word_ru': word_ru,
+        'definition': definition,
+    }
     
-    # Неизвестная команда
-    logger.warning(f"Получен неизвестный callback_data: {data}")
-    await context.bot.send_message(chat_id=chat_id, text="Неизвестная команда. Попробуйте начать сначала с помощью /start")
+    # Отправляем данные на сервер
+    await save_word(context, chat_id, payload, f"✅ Слово «{word_en}» принято!", query=query)
+    
+    words_queue = session.words_queue
+    if words_queue:
+        words_queue.popleft()
+    await process_next_word(context, chat_id)
+
+
+async def handle_action_callback(update: Update, context: ContextTypes.DEFAULT_TYPE):
+    """
+    Обрабатывает действия со словом (action::rewrite_early|rewrite|skip).
+    
+    Args:
+        update: Объект обновления от Telegram
+        context: Контекст бота
+    """
+    session = get_session(context)
+    query = update.callback_query
+    await query.answer()
+    chat_id = query.message.chat_id
+
+    action = query.data.partition("::")[2]
+    if session.src is None:  # кнопка осталась от сессии до /start, перезапуска или вытеснения
+        await query.edit_message_text(SESSION_EXPIRED_TEXT)
+        return
+    
+    if action == "rewrite_early":
+        await request_rewrite_words(update, context, chat_id, early_rewrite=True)
+    elif action == "rewrite":
+        await request_rewrite_words(update, context, chat_id)
+    elif action == "skip":
+        words_queue = session.words_queue
+        if words_queue:
+            skipped_word = words_queue.popleft()
+            await query.edit_message_text(f"⏭ Слово «{skipped_word}» пропущено.")
+        await process_next_word(context, chat_id)
+
+
+async def handle_unknown_callback(update: Update, context: ContextTypes.DEFAULT_TYPE):
+    """
+    Отвечает на нажатие кнопки, не подошедшей ни под один обработчик.
+    
+    Args:
+        update: Объект обновления от Telegram
+        context: Контекст бота
+    """
+    query = update.callback_query
+    await query.answer()
+    logger.warning("Получен неизвестный callback_data: %s", query.data)
+    await context.bot.send_message(
+        chat_id=query.message.chat_id,
+        text="Неизвестная команда. Попробуйте начать сначала с помощью /start"
+    )
 
 # === ОСНОВНАЯ ФУНКЦИЯ ЗАПУСКА ===
 
+async def post_init(application: Application):
+    """Создаёт HTTP-клиенты и пакетный переводчик после запуска event loop."""
+    global http_client, api_client, deepl_batcher
+    # Python 3.12+: задачи выполняются синхронно до первого await, поэтому
+    # обработчики, отвечающие из кэша, не платят за планирование Task
+    if hasattr(asyncio, 'eager_task_factory'):
+        asyncio.get_running_loop().set_task_factory(asyncio.eager_task_factory)
+
+    # HTTP/2 мультиплексирует параллельные запросы к одному хосту
+    # в одном TLS-соединении; неудачные подключения повторяются транспортом.
+    # Сжатые ответы (brotli/gzip) httpx распаковывает сам: страницы Cambridge
+    # передаются в несколько раз меньшим объёмом
+    transport = httpx.AsyncHTTPTransport(
+        http2=True,
+        retries=2,
+        limits=httpx.Limits(
+            max_connections=100,
+            max_keepalive_connections=50,
+            keepalive_expiry=60
+        )
+    )
+    http_client = httpx.AsyncClient(
+        transport=transport,
+        headers={'Accept-Encoding': 'br, gzip'},
+        timeout=10.0
+    )
+    # API сервера слов обычно локальный и работает по HTTP/1.1: держим
+    # несколько keep-alive соединений с заранее заданными заголовками
+    api_headers = {'Content-Type': 'application/json'}
+    if CONFIG.bot_api_key:
+        api_headers['X-API-Key'] = CONFIG.bot_api_key
+    api_client = httpx.AsyncClient(
+        base_url=CONFIG.base_api_url.rstrip('/') + '/',
+        headers=api_headers,
+        transport=httpx.AsyncHTTPTransport(
+            retries=2,
+            limits=httpx.Limits(max_connections=32, max_keepalive_connections=32, keepalive_expiry=60)
+        ),
+        timeout=10.0
+    )
+    if CONFIG.deepl_api_key:
+        deepl_batcher = DeepLBatcher()
+        deepl_batcher.start()
+
+    # Подтверждаем в Telegram обновления, обработанные до перезапуска
+    if update_offset_store is not None:
+        offset = update_offset_store.get()
+        if offset:
+            # getUpdates при установленном webhook завершается Conflict:
+            # удаляем его сразу (start_polling сделал бы это позже)
+            await application.bot.delete_webhook()
+            await application.bot.get_updates(
+                offset=offset, limit=1, timeout=0, allowed_updates=ALLOWED_UPDATES
+            )
+            logger.info("Обновления до offset %s подтверждены после перезапуска", offset)
+
+
+async def post_shutdown(application: Application):
+    """Останавливает пакетный переводчик, закрывает HTTP-клиенты и файл offset."""
+    if deepl_batcher is not None:
+        await deepl_batcher.stop()
+    if http_client is not None:
+        await http_client.aclose()
+    if api_client is not None:
+        await api_client.aclose()
+    if update_offset_store is not None:
+        update_offset_store.close()
+
+
 def main():
     """Основная функция запуска бота."""
-    application = Application.builder().token(TOKEN).build()
+    global update_offset_store
+
+    # uvloop (libuv) быстрее стандартного event loop; на Windows он недоступен
+    try:
+        import uvloop
+        asyncio.set_event_loop_policy(uvloop.EventLoopPolicy())
+        logger.info("Используется event loop uvloop")
+    except ImportError:
+        pass
+
+    # Постоянные HTTP/2-соединения с api.telegram.org: ответы пользователям
+    # не открывают новое TLS-соединение на каждый вызов. getUpdates получает
+    # отдельный пул, а AIORateLimiter держит рассылки в лимитах Telegram
+    application = (
+        Application.builder()
+        .token(CONFIG.token)
+        .http_version('2')
+        .connection_pool_size(32)
+        .connect_timeout(5)
+        .read_timeout(30)
+        .pool_timeout(20)
+        .get_updates_http_version('2')
+        .get_updates_connection_pool_size(4)
+        .get_updates_pool_timeout(20)
+        .rate_limiter(AIORateLimiter(
+            overall_max_rate=28,
+            overall_time_period=1,
+            group_max_rate=18,
+            group_time_period=60,
+            # По умолчанию RetryAfter пробрасывается в обработчик без повтора
+            max_retries=3
+        ))
+        .post_init(post_init)
+        .post_shutdown(post_shutdown)
+        .build()
+    )
 
     # Регистрируем обработчики
+    # Группа -1 выполняется раньше основных: отмечаем активность пользователя
+    application.add_handler(TypeHandler(Update, touch_session), group=-1)
     application.add_handler(CommandHandler('start', start))
     application.add_handler(MessageHandler(filters.TEXT & ~filters.COMMAND, handle_text))
     
-    # Сначала регистрируем СПЕЦИФИЧЕСКИЕ обработчики callback-запросов
+    # Обработчики callback-запросов по префиксу callback_data
     application.add_handler(CallbackQueryHandler(handle_quiz_answer, pattern=r'^quiz_answer::'))
-    
-    # Затем регистрируем ОБЩИЙ обработчик callback-запросов
-    application.add_handler(CallbackQueryHandler(callback_query_handler))
+    application.add_handler(CallbackQueryHandler(handle_select_trans_callback, pattern=r'^select_trans::'))
+    application.add_handler(CallbackQueryHandler(handle_def_choice_callback, pattern=r'^def_choice::'))
+    application.add_handler(CallbackQueryHandler(handle_action_callback, pattern=r'^action::'))
+    application.add_handler(CallbackQueryHandler(handle_lang_callback, pattern=r'^lang::(ru|en)$'))
+    application.add_handler(CallbackQueryHandler(handle_mode_callback, pattern=r'^mode::(add|quiz)$'))
+    application.add_handler(CallbackQueryHandler(handle_post_callback, pattern=r'^post_(add|quiz|finish)$'))
+    
+    # Последним — обработчик неизвестных callback-запросов
+    application.add_handler(CallbackQueryHandler(handle_unknown_callback))
+
+    # В режиме polling после обработки каждого обновления сохраняем offset
+    # (группа 1 выполняется после основных обработчиков)
+    if not CONFIG.webhook_host:
+        update_offset_store = UpdateOffsetStore(CONFIG.update_offset_path)
+        application.add_handler(TypeHandler(Update, remember_update_offset), group=1)
     
     # Настраиваем JobQueue для напоминаний
     job_queue = application.job_queue
     
     # Тестовый режим: отправляем напоминание через 5 секунд после запуска
-    if TEST_MODE and ADMIN_CHAT_ID:
+    if TEST_MODE and CONFIG.admin_chat_id:
         try:
-            admin_chat_id = int(ADMIN_CHAT_ID)
+            admin_chat_id = int(CONFIG.admin_chat_id)
             job_queue.run_once(
                 send_reminder, 
                 5, 
@@ -1011,21 +2287,49 @@ def main():
             )
             logger.info("Тестовое напоминание будет отправлено через 5 секунд")
         except (ValueError, TypeError) as e:
-            logger.error(f"Ошибка настройки тестового режима: некорректный ADMIN_CHAT_ID ({ADMIN_CHAT_ID}): {e}")
-    
-    # Регулярное напоминание в 20:00 по UTC
-    job_queue.run_daily(
-        send_reminder,
-        time=datetime.time(hour=20, minute=0, second=0, tzinfo=datetime.timezone.utc),
-        name="daily_reminder"
+            logger.error("Ошибка настройки тестового режима: некорректный ADMIN_CHAT_ID (%s): %s", CONFIG.admin_chat_id, e)
+    
+    # Напоминания в 20:00 по UTC: сроки хранятся в SQLite, раз в час
+    # в JobQueue ставятся только ближайшие
+    job_queue.run_repeating(
+        schedule_due_reminders,
+        interval=REMINDER_SCAN_INTERVAL,
+        first=0,
+        name="reminder_scan"
+    )
+    logger.info("Ежедневные напоминания настроены на 20:00 UTC")
+    
+    # Периодически освобождаем память от состояний неактивных пользователей
+    job_queue.run_repeating(
+        evict_stale_sessions,
+        interval=SESSION_SWEEP_INTERVAL,
+        first=SESSION_SWEEP_INTERVAL,
+        name="session_sweep"
     )
-    logger.info("Ежедневное напоминание настроено на 20:00 UTC")
     
     logger.info("Бот запущен...")
     try:
-        application.run_polling()
+        if CONFIG.webhook_host:
+            # TLS терминируется на reverse proxy (nginx/Caddy) перед ботом
+            logger.info("Запуск в режиме webhook: https://%s/<token>", CONFIG.webhook_host)
+            application.run_webhook(
+                listen='0.0.0.0',
+                port=CONFIG.webhook_port,
+                url_path=CONFIG.token,
+                webhook_url=f"https://{CONFIG.webhook_host}/{CONFIG.token}",
+                secret_token=CONFIG.webhook_secret,
+                allowed_updates=ALLOWED_UPDATES
+            )
+        else:
+            # Long polling: getUpdates ждёт на стороне Telegram до 30 секунд
+            application.run_polling(
+                poll_interval=0.0,
+                timeout=30,
+                bootstrap_retries=-1,
+                allowed_updates=ALLOWED_UPDATES
+            )
     except Exception as e:
-        logger.critical(f"Критическая ошибка при запуске бота: {e}")
+        logger.critical("Критическая ошибка при запуске бота: %s", e)
         raise
 
 if __name__ == '__main__':